@@ -0,0 +1,404 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Benchmarks of representative workloads.
+
+Usage:
+    python benchmark.py -o results.json
+    python benchmark.py -k engine --compare results.json
+
+The results are written as JSON, so runs of different commits can be
+compared. Table and chart are rendered on the offscreen Qt platform, unless
+QT_QPA_PLATFORM is set. Benchmarks, whose modules cannot be imported, are
+skipped.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import log
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name: function returning the callable to be timed
+BENCHMARKS = {}
+
+_QT_APP = None
+
+
+def benchmark(name):
+    """
+    Registers a benchmark. The decorated function prepares the workload and
+    returns a callable without arguments, which is timed.
+
+    :param name (str): name of the benchmark, prefixed by its group
+    """
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def _qt_app():
+    """
+    :returns: the application, which is needed by widgets
+    :rtype: QApplication
+    """
+    global _QT_APP
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    if _QT_APP is None:
+        _QT_APP = QApplication.instance() or QApplication([sys.argv[0]])
+    return _QT_APP
+
+
+def _kredit(betrag, tilgung, zins, sondertilgungen):
+    from kredit import AnnuitaetenKredit
+    kredit = AnnuitaetenKredit(betrag, tilgung, zins)
+    return lambda: kredit.berechne_kreditverlauf(sondertilgungen)
+
+
+@benchmark('engine.short')
+def _engine_short():
+    # 10 years
+    return _kredit(100000.0, 8.0, 3.0, {})
+
+
+@benchmark('engine.long')
+def _engine_long():
+    # 1761 months, about 147 years
+    return _kredit(500000.0, 0.3, 1.0, {})
+
+
+@benchmark('engine.few_extra_payments')
+def _engine_few_extra_payments():
+    return _kredit(300000.0, 2.0, 3.5, {12 * year: 5000.0 for year in range(1, 6)})
+
+
+@benchmark('engine.many_extra_payments')
+def _engine_many_extra_payments():
+    return _kredit(300000.0, 2.0, 3.5, {month: 100.0 for month in range(360)})
+
+
+@benchmark('engine.zero_redemption')
+def _engine_zero_redemption():
+    from kredit import AnnuitaetenKredit
+    # paid off only due to the extra payment, 1446 months
+    kredit = AnnuitaetenKredit(300000.0, 0.0, 3.5)
+    sondertilgungen = {39: 5000.0}
+    laufzeit = kredit.berechne_segmentiert(sondertilgungen).Laufzeit
+    if kredit.berechne_kreditverlauf(sondertilgungen).Laufzeit != laufzeit:
+        raise AssertionError("Term differs from berechne_segmentiert")
+    return lambda: kredit.berechne_kreditverlauf(sondertilgungen)
+
+
+@benchmark('engine.cent')
+def _engine_cent():
+    from kredit import CentKredit
+    kredit = CentKredit(300000.0, 2.0, 3.5)
+    sondertilgungen = {12 * year: 5000.0 for year in range(1, 6)}
+    return lambda: kredit.berechne_kreditverlauf(sondertilgungen)
+
+
+@benchmark('engine.segmented')
+def _engine_segmented():
+    from kredit import AnnuitaetenKredit
+    kredit = AnnuitaetenKredit(300000.0, 2.0, 3.5)
+    sondertilgungen = {12 * year: 5000.0 for year in range(1, 6)}
+    return lambda: kredit.berechne_segmentiert(sondertilgungen)
+
+
+@benchmark('engine.segmented_rate_changes')
+def _engine_segmented_rate_changes():
+    from kredit import AnnuitaetenKredit
+    # new fixed-rate period every 10 years, monthly rate recalculated
+    kredit = AnnuitaetenKredit(
+        300000.0, 2.0, 3.5, {120: (4.5, 2.0), 240: (5.0, 2.5), 360: 3.0})
+    sondertilgungen = {12 * year: 5000.0 for year in range(1, 6)}
+    return lambda: kredit.berechne_segmentiert(sondertilgungen)
+
+
+@benchmark('engine.bundle')
+def _engine_bundle():
+    from buendel import KreditBuendel, Tranche
+    buendel = KreditBuendel([
+        Tranche(200000.0, 2.0, 3.5, sondertilgungen={12 * year: 5000.0 for year in range(1, 6)}),
+        Tranche(100000.0, 3.0, 1.5, tilgungsfrei=24),
+        Tranche(50000.0, 6.0, 2.5, beginn=12)])
+    return buendel.berechne_kreditverlauf
+
+
+def _loans(count):
+    return [
+        (100000.0 + 1000.0 * (i % 400), 1.0 + (i % 5), 1.0 + (i % 7) * 0.5, {})
+        for i in range(count)]
+
+
+@benchmark('batch.runner_1000')
+def _batch_runner():
+    import runner
+    loans = _loans(1000)
+    return lambda: runner.run_portfolio(loans, workers=1)
+
+
+@benchmark('batch.portfolio_10000')
+def _batch_portfolio():
+    import numpy
+    from portfolio import berechne_kennzahlen
+    loans = _loans(10000)
+    betraege, tilgungen, zinsen = (
+        numpy.array([loan[i] for loan in loans]) for i in range(3))
+    return lambda: berechne_kennzahlen(betraege, tilgungen, zinsen)
+
+
+@benchmark('batch.raster_monthly_extra_payments')
+def _batch_raster_monthly_extra_payments():
+    import numpy
+    from portfolio import berechne_raster
+    # grid of the sensitivity window, 200 x 200 points
+    zinsen = numpy.linspace(0.5, 8.0, 200)
+    tilgungen = numpy.linspace(0.5, 8.0, 200)
+    sondertilgungen = {month: 200.0 for month in range(360)}
+    return lambda: berechne_raster(300000.0, zinsen, tilgungen, sondertilgungen)
+
+
+@benchmark('batch.portfolio_schedules_2000')
+def _batch_portfolio_schedules():
+    from portfolio import AnnuitaetenPortfolio
+    loans = _loans(2000)
+    portfolio = AnnuitaetenPortfolio(*([loan[i] for loan in loans] for i in range(3)))
+    return portfolio.berechne_kreditverlaeufe
+
+
+@benchmark('gui.show_table')
+def _gui_show_table():
+    app = _qt_app()
+    from PyQt5.QtCore import QDate
+    from PyQt5.QtWidgets import QWidget
+    from kredit import AnnuitaetenKredit
+    from table import TableDialog
+    verlauf = AnnuitaetenKredit(300000.0, 2.0, 3.5).berechne_kreditverlauf()
+    # The dialog is placed relative to its parent
+    parent = QWidget()
+    parent.setGeometry(300, 300, 300, 300)
+    dialog = TableDialog(parent)
+    def show_table(parent=parent): # the parent keeps the dialog alive
+        dialog.show_table(verlauf, QDate(2018, 1, 1))
+        # render the visible rows
+        dialog.grab()
+        app.processEvents()
+    return show_table
+
+
+@benchmark('gui.plot')
+def _gui_plot():
+    _qt_app()
+    from kredit import AnnuitaetenKredit
+    from plot import PlotWindow
+    verlauf = AnnuitaetenKredit(300000.0, 2.0, 3.5).berechne_kreditverlauf()
+    window = PlotWindow()
+    def plot():
+        window.plot(verlauf)
+        window.canvas.draw()
+    return plot
+
+
+@benchmark('util.month_diff')
+def _util_month_diff():
+    import util
+    dates = [util.parse_month("{:02d}/{}".format(1 + i % 12, 2000 + i // 12)) for i in range(1000)]
+    start = (2000, 1)
+    return lambda: [util.month_diff(date, start) for date in dates]
+
+
+@benchmark('util.month_offsets')
+def _util_month_offsets():
+    import util
+    texts = ["{:02d}/{}".format(1 + i % 12, 2000 + i // 12) for i in range(1000)]
+    return lambda: util.month_offsets(texts, "01/2000")
+
+
+@benchmark('settings.save_load')
+def _settings_save_load():
+    from settings import CreditSettings, load_settings, save_settings
+    settings = CreditSettings(
+        300000.0, 3.5, 2.0, "01/2018",
+        [("{:02d}/{}".format(1 + i % 12, 2018 + i // 12), 100.0) for i in range(120)])
+    directory = tempfile.TemporaryDirectory()
+    file_name = os.path.join(directory.name, 'project.json')
+    def save_load(directory=directory): # removed with the callable
+        save_settings(settings, file_name)
+        load_settings(file_name)
+    return save_load
+
+
+@benchmark('settings.load_yaml')
+def _settings_load_yaml():
+    from settings import load_settings
+    # project file of older versions
+    lines = [
+        "!!python/object:dialog.CreditSettings",
+        "extra_payments:"]
+    lines.extend(
+        "- !!python/tuple ['{:02d}/{}', 100.0]".format(1 + i % 12, 2018 + i // 12)
+        for i in range(120))
+    lines.extend([
+        "kreditsumme: 300000.0",
+        "start_date: 01/2018",
+        "tilgung: 2.0",
+        "zins: 3.5"])
+    directory = tempfile.TemporaryDirectory()
+    file_name = os.path.join(directory.name, 'project.yaml')
+    with open(file_name, 'w') as file:
+        file.write("\n".join(lines) + "\n")
+    def load(directory=directory): # removed with the callable
+        load_settings(file_name)
+    return load
+
+
+def _import_time(module):
+    """
+    :returns: time of importing module in a new interpreter
+    :rtype: float
+    """
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         "import time; t = time.perf_counter(); import {}; "
+         "print(time.perf_counter() - t)".format(module)],
+        cwd=_DIR, env=env)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def _measure_startup(repeat):
+    times = [_import_time('dialog') for _ in range(repeat)]
+    return {'number': 1, 'min': min(times), 'median': statistics.median(times)}
+
+
+def measure(function, repeat=5):
+    """
+    Times a benchmark. The number of calls per measurement is chosen, so a
+    measurement takes at least 0.2 s.
+
+    :param function (callable): the workload
+    :param repeat (int): number of measurements
+    :returns: number of calls per measurement, minimum and median time per call in s
+    :rtype: dict
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {'number': number, 'min': min(times), 'median': statistics.median(times)}
+
+
+def _commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names, repeat=5):
+    """
+    Runs benchmarks.
+
+    :param names (list of str): names of the benchmarks
+    :param repeat (int): number of measurements per benchmark
+    :returns: results, see main
+    :rtype: dict
+    """
+    results = {}
+    for name in names:
+        try:
+            if name == 'startup.import_dialog':
+                results[name] = _measure_startup(repeat)
+            else:
+                results[name] = measure(BENCHMARKS[name](), repeat)
+        except ImportError as ex:
+            log.LOGGER.error("%s skipped: %s", name, ex)
+            continue
+        print("{:<30} {:>12.6f} s".format(name, results[name]['min']))
+    return {
+        'commit': _commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmarks': results}
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the ratio of the times of two runs.
+
+    :param results (dict): current run
+    :param baseline (dict): earlier run
+    :param threshold (float): ratio, above which a benchmark counts as regression
+    :returns: names of the regressed benchmarks
+    :rtype: list of str
+    """
+    regressions = []
+    for name, result in sorted(results['benchmarks'].items()):
+        old = baseline['benchmarks'].get(name)
+        if old is None:
+            continue
+        ratio = result['min'] / old['min']
+        print("{:<30} {:>12.6f} s {:>12.6f} s {:>7.2f}x".format(
+            name, old['min'], result['min'], ratio))
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    """
+    Entry point.
+
+    :param argv (list of str): command line arguments
+    :returns: exit code, 1 if a benchmark regressed
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description="Run the benchmarks.")
+    parser.add_argument(
+        '-k', '--select', default='',
+        help="run only benchmarks, whose name contains this text")
+    parser.add_argument(
+        '-o', '--output', help="JSON file for the results")
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5, help="measurements per benchmark")
+    parser.add_argument(
+        '--compare', help="JSON file of an earlier run to compare with")
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help="slowdown, which counts as regression (default: 1.2)")
+    args = parser.parse_args(argv)
+
+    names = [
+        name for name in sorted(BENCHMARKS) + ['startup.import_dialog']
+        if args.select in name]
+    results = run(names, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Financings of several tranches, e.g. a bank loan, a KfW loan with
+redemption-free months and a building-society loan, calculated on a shared
+month axis.
+
+The combined schedule is a Kreditverlauf, so it is shown by
+TableDialog.show_table and PlotWindow.plot like the schedule of a single
+loan. The schedules of the tranches on the shared axis can be passed to
+PlotWindow.plot as further schedules:
+
+    buendel = KreditBuendel([
+        Tranche(200000.0, 2.0, 3.5, name='Bank'),
+        Tranche(100000.0, 3.0, 1.5, tilgungsfrei=24, name='KfW'),
+        Tranche(50000.0, 6.0, 2.5, beginn=12, name='Bausparen')])
+    verlauf = buendel.berechne_kreditverlauf()
+    window.plot(verlauf, buendel.tranchenverlaeufe)
+
+The dialog and the project files cover a single loan, so bundles are built
+in code only.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+from array import array
+
+from kredit import AnnuitaetenKredit, Kreditverlauf
+
+
+class Tranche(object):
+    """
+    One loan of a financing.
+    """
+    def __init__(self, betrag, tilgung, zins, beginn=0, tilgungsfrei=0,
+                 sondertilgungen=None, zinsaenderungen=None, name=None):
+        """
+        C'tor.
+
+        :param betrag (float): loan amount
+        :param tilgung (float): redemption rate in %
+        :param zins (float): nominal interest in %
+        :param beginn (int): months between the start of the financing and
+               the first month of the tranche, see util.month_diff
+        :param tilgungsfrei (int): number of months at the beginning, in which
+               interest is paid only
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month of the tranche, value: amount. Not allowed within
+               the redemption-free months.
+        :param zinsaenderungen (dict): Interest changes, see
+               AnnuitaetenKredit. key: month of the tranche. Not allowed
+               within the redemption-free months. A change at the month
+               tilgungsfrei is valid from the first month of the annuity,
+               e.g. a new interest after the redemption-free months.
+        :param name (str): name of the tranche
+        """
+        if beginn < 0 or tilgungsfrei < 0:
+            raise ValueError("Start and redemption-free months must not be negative")
+        self.betrag = betrag
+        self.tilgung = tilgung
+        self.zins = zins
+        self.beginn = beginn
+        self.tilgungsfrei = tilgungsfrei
+        self.sondertilgungen = dict(sondertilgungen or {})
+        self.zinsaenderungen = dict(zinsaenderungen or {})
+        self.name = name
+
+    def _verschoben(self, werte):
+        """
+        Moves the keys from the months of the tranche to the months of the
+        annuity after the redemption-free months.
+
+        :param werte (dict): extra payments or interest changes
+        :rtype: dict
+        """
+        if any(monat < self.tilgungsfrei for monat in werte):
+            raise ValueError("Extra payments and interest changes must lie "
+                             "after the redemption-free months")
+        return {monat - self.tilgungsfrei: wert for monat, wert in werte.items()}
+
+    def berechne_kreditverlauf(self):
+        """
+        Calculate schedule of the tranche. The months are those of the
+        financing, i.e. the first month is beginn + 1.
+
+        :return: schedule
+        :rtype: Kreditverlauf
+        :raises ValueError: if the tranche is never paid off.
+        """
+        kredit = AnnuitaetenKredit(
+            self.betrag, self.tilgung, self.zins, self._verschoben(self.zinsaenderungen))
+        annuitaet = kredit.berechne_kreditverlauf(self._verschoben(self.sondertilgungen))
+
+        # Interest only in the redemption-free months
+        frei = self.tilgungsfrei
+        zins = array('d', [self.betrag * (self.zins / 100.0) / 12] * frei)
+        zins.extend(annuitaet.spalte('Zinsanteil'))
+        tilgung = array('d', bytes(8 * frei))
+        tilgung.extend(annuitaet.spalte('Tilgungsanteil'))
+        soti = array('d', bytes(8 * frei))
+        soti.extend(annuitaet.spalte('Sondertilgungsanteil'))
+        restschuld = array('d', [float(self.betrag)] * frei)
+        restschuld.extend(annuitaet.spalte('Restschuld'))
+        monat = array('i', range(self.beginn + 1, self.beginn + len(zins) + 1))
+        return Kreditverlauf.aus_puffern(monat, zins, tilgung, soti, restschuld)
+
+
+class KreditBuendel(object):
+    """
+    Calculator for a financing of several tranches. The schedules of the
+    tranches are added month by month. Months before the first month of a
+    tranche and after its payoff contribute nothing, the balance includes
+    paid out tranches only.
+    """
+
+    def __init__(self, tranchen):
+        """
+        C'tor.
+
+        :param tranchen (sequence of Tranche objects): the tranches
+        """
+        self._tranchen = list(tranchen)
+        self._tranchenverlaeufe = []
+        self._verlauf = Kreditverlauf()
+
+    @property
+    def tranchen(self):
+        """
+        :rtype: list of Tranche objects
+        """
+        return self._tranchen
+
+    @property
+    def tranchenverlaeufe(self):
+        """
+        Schedules of the tranches on the month axis of the financing, in the
+        order of the tranches.
+
+        :rtype: list of Kreditverlauf objects
+        """
+        return self._tranchenverlaeufe
+
+    def berechne_kreditverlauf(self):
+        """
+        Calculate the combined schedule.
+
+        :return: schedule with a row for every month from the start of the
+                 financing until the last tranche is paid off
+        :rtype: Kreditverlauf
+        :raises ValueError: if a tranche is never paid off.
+        """
+        verlaeufe = []
+        for nummer, tranche in enumerate(self._tranchen):
+            try:
+                verlaeufe.append(tranche.berechne_kreditverlauf())
+            except ValueError as ex:
+                raise ValueError("Tranche {}: {}".format(tranche.name or nummer + 1, ex))
+
+        laufzeit = max((verlauf.Laufzeit for verlauf in verlaeufe), default=0)
+        # The tranches are added column by column on the shared month axis
+        spalten = []
+        for name in ('Zinsanteil', 'Tilgungsanteil', 'Sondertilgungsanteil', 'Restschuld'):
+            summe = array('d', bytes(8 * laufzeit))
+            for tranche, verlauf in zip(self._tranchen, verlaeufe):
+                for index, wert in enumerate(verlauf.spalte(name), tranche.beginn):
+                    summe[index] += wert
+            spalten.append(summe)
+
+        self._tranchenverlaeufe = verlaeufe
+        self._verlauf = Kreditverlauf.aus_puffern(array('i', range(1, laufzeit + 1)), *spalten)
+        return self._verlauf
+
+    def zahlungen(self):
+        """
+        Combined cash flow of the last calculated schedule.
+
+        :return: payments (interest, redemption and extra payment) per month
+        :rtype: array of float
+        """
+        return array('d', (
+            zins + tilgung + soti for zins, tilgung, soti in zip(
+                self._verlauf.spalte('Zinsanteil'),
+                self._verlauf.spalte('Tilgungsanteil'),
+                self._verlauf.spalte('Sondertilgungsanteil'))))
+
+    @property
+    def GesamtKosten(self):
+        """
+        Sum of interest payments of all tranches.
+        """
+        return self._verlauf.GesamtKosten
+
+    @property
+    def Laufzeit(self):
+        """
+        Number of months until the last tranche is paid off.
+        """
+        return len(self._verlauf)
@@ -0,0 +1,152 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Bounded cache for calculated credit schedules.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import collections
+import threading
+
+from kredit import AnnuitaetenKredit, _zinsaenderungen
+
+POLICY_LRU = 'lru' # evict the least recently used schedule
+POLICY_FIFO = 'fifo' # evict the oldest schedule
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'size', 'maxsize'])
+
+
+def schluessel(betrag, tilgung, zins, sondertilgungen={}, zinsaenderungen=None):
+    """
+    Canonical, hashable key of the loan parameters.
+
+    :param betrag (float): loan amount
+    :param tilgung (float): redemption rate in %
+    :param zins (float): nominal interest in %
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :param zinsaenderungen (dict): Interest changes, see AnnuitaetenKredit.
+    :rtype: tuple
+    """
+    return (
+        float(betrag),
+        float(tilgung),
+        float(zins),
+        tuple(sorted((int(monat), float(betrag)) for monat, betrag in sondertilgungen.items())),
+        tuple(sorted(
+            (monat, float(zins), None if tilgung is None else float(tilgung))
+            for monat, (zins, tilgung) in _zinsaenderungen(zinsaenderungen).items())))
+
+
+class KreditverlaufCache(object):
+    """
+    Cache in front of AnnuitaetenKredit.berechne_kreditverlauf. The cached
+    schedules are frozen, so they can be shared by all callers.
+    """
+    def __init__(self, maxsize=128, policy=POLICY_LRU):
+        """
+        C'tor.
+
+        :param maxsize (int): maximum number of schedules
+        :param policy (str): POLICY_LRU or POLICY_FIFO
+        """
+        if policy not in (POLICY_LRU, POLICY_FIFO):
+            raise ValueError("Unknown eviction policy {}".format(policy))
+        self._maxsize = maxsize
+        self._policy = policy
+        self._verlaeufe = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def berechne_kreditverlauf(
+            self, betrag, tilgung, zins, sondertilgungen={}, kredit=None, fortschritt=None,
+            zinsaenderungen=None):
+        """
+        Calculate schedule or take it from the cache.
+
+        :param betrag (float): loan amount
+        :param tilgung (float): redemption rate in %
+        :param zins (float): nominal interest in %
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :param kredit (AnnuitaetenKredit): calculator with the same betrag,
+               tilgung, zins and zinsaenderungen. On a miss its last schedule is updated
+               incrementally instead of calculating from scratch.
+        :param fortschritt (callable): if given, called with the current month
+               during the calculation. It may raise an exception to stop the
+               calculation, nothing is cached then.
+        :param zinsaenderungen (dict): Interest changes, see AnnuitaetenKredit.
+        :return: frozen schedule
+        :rtype: Kreditverlauf
+        """
+        key = schluessel(betrag, tilgung, zins, sondertilgungen, zinsaenderungen)
+        with self._lock:
+            verlauf = self._verlaeufe.get(key)
+            if verlauf is not None:
+                self._hits += 1
+                if self._policy == POLICY_LRU:
+                    self._verlaeufe.move_to_end(key)
+                return verlauf
+            self._misses += 1
+
+        # Calculate without holding the lock
+        if kredit is None:
+            kredit = AnnuitaetenKredit(betrag, tilgung, zins, zinsaenderungen)
+        verlauf = kredit.aktualisiere_kreditverlauf(
+            dict(sondertilgungen), fortschritt).einfrieren()
+
+        with self._lock:
+            self._verlaeufe[key] = verlauf
+            self._verlaeufe.move_to_end(key)
+            self._evict()
+        return verlauf
+
+    def _evict(self):
+        """
+        Removes schedules beyond the maximum size.
+        """
+        while len(self._verlaeufe) > self._maxsize:
+            self._verlaeufe.popitem(last=False)
+            self._evictions += 1
+
+    @property
+    def maxsize(self):
+        """
+        Maximum number of schedules.
+        """
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def info(self):
+        """
+        :returns: hit/miss statistics
+        :rtype: CacheInfo
+        """
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._evictions,
+                len(self._verlaeufe), self._maxsize)
+
+    def clear(self):
+        """
+        Removes all schedules and resets the statistics.
+        """
+        with self._lock:
+            self._verlaeufe.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+# Cache shared by the application
+CACHE = KreditverlaufCache()
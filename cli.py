@@ -0,0 +1,237 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Headless batch mode. Calculates project files or CSV files of loans without
+PyQt5 and matplotlib.
+
+Usage:
+    python cli.py project1.json project2.yaml projects/ loans.csv -o summary.csv
+
+A directory stands for all project files in it. A CSV file of loans has the columns kreditsumme, tilgung, zins and optionally
+name and start_date (MM/yyyy).
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import argparse
+import csv
+import os
+import sys
+
+import export
+import log
+import runner
+from kredit import AnnuitaetenKredit
+from settings import CreditSettings, ProjectFileError, load_directory, load_settings
+
+SUMMARY_COLUMNS = (
+    'name',
+    'kreditsumme',
+    'tilgung',
+    'zins',
+    'monatsrate',
+    'laufzeit',
+    'gesamtkosten')
+
+
+def read_projects(file_name):
+    """
+    Reads a project file, a directory of project files or a CSV file of
+    loans.
+
+    :param file_name (str): path of a project file, a directory or a .csv file
+    :returns: list of (name, CreditSettings)
+    """
+    if os.path.isdir(file_name):
+        projects, errors = load_directory(file_name)
+        for _, message in errors:
+            log.LOGGER.error(message)
+        return [
+            (os.path.splitext(os.path.basename(path))[0], settings)
+            for path, settings in projects]
+    base_name = os.path.splitext(os.path.basename(file_name))[0]
+    if not file_name.lower().endswith('.csv'):
+        return [(base_name, load_settings(file_name))]
+    projects = []
+    with open(file_name, newline='') as file:
+        for row_no, row in enumerate(csv.DictReader(file)):
+            settings = CreditSettings(
+                kreditsumme=float(row['kreditsumme']),
+                zins=float(row['zins']),
+                tilgung=float(row['tilgung']),
+                start_date=row.get('start_date') or "01/2000",
+                extra_payments=[])
+            name = row.get('name') or "{}-{}".format(base_name, row_no + 1)
+            projects.append((name, settings))
+    return projects
+
+
+def summarize(name, settings, summary):
+    """
+    Formats the summary of a project.
+
+    :param name (str): name of the project
+    :param settings (CreditSettings): the project
+    :param summary (runner.LoanSummary): the calculated key figures
+    :returns: values of SUMMARY_COLUMNS
+    :rtype: dict
+    """
+    return {
+        'name': name,
+        'kreditsumme': settings.kreditsumme,
+        'tilgung': settings.tilgung,
+        'zins': settings.zins,
+        'monatsrate': "{:.2f}".format(summary.Monatsrate),
+        'laufzeit': summary.Laufzeit,
+        'gesamtkosten': "{:.2f}".format(summary.GesamtKosten)}
+
+
+def calculate_schedule(name, settings):
+    """
+    :param name (str): name of the project
+    :param settings (CreditSettings): the project
+    :returns: name, start date and the schedule, see export.export
+    :raises ValueError: if the schedule cannot be calculated
+    """
+    kredit = AnnuitaetenKredit(settings.kreditsumme, settings.tilgung, settings.zins)
+    return name, settings.start_date, kredit.berechne_kreditverlauf(settings.sondertilgungen())
+
+
+def write_schedule(name, settings, file_name):
+    """
+    Writes the schedule of a project into a CSV file.
+
+    :param name (str): name of the project
+    :param settings (CreditSettings): the project
+    :param file_name (str): path of the CSV file
+    :raises ValueError: if the schedule cannot be calculated
+    :raises OSError: if the file cannot be written
+    """
+    # The file is written only, if the schedule can be calculated
+    export.export_csv([calculate_schedule(name, settings)], file_name)
+
+
+def _schedules(projects, errors):
+    """
+    Calculates the schedules of the projects one by one, while they are
+    exported. Projects, whose schedule cannot be calculated, are left out.
+
+    :param projects (iterable of (str, CreditSettings)): name and project
+    :param errors (list): name and message of the left out projects are
+           appended
+    :returns: generator of schedules, see export.export
+    """
+    for name, settings in projects:
+        try:
+            yield calculate_schedule(name, settings)
+        except ValueError as ex:
+            errors.append((name, str(ex)))
+
+
+def main(argv=None):
+    """
+    Entry point of the batch mode.
+
+    :param argv (list of str): command line arguments
+    :returns: exit code
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Calculate annuity loans without GUI.")
+    parser.add_argument(
+        'files', nargs='+',
+        help="project files (.json, .yaml), directories of project files "
+             "or CSV files of loans (.csv)")
+    parser.add_argument(
+        '-o', '--output',
+        help="CSV file for the summaries (default: standard output)")
+    parser.add_argument(
+        '-s', '--schedules',
+        help="directory to write one schedule CSV file per project into")
+    parser.add_argument(
+        '-e', '--export',
+        help="write all schedules into one CSV file (.csv) or a directory of "
+             "NumPy files (any other path)")
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="number of worker processes (0: one per CPU, default: 1)")
+    parser.add_argument(
+        '-c', '--chunk-size', type=int, default=runner.DEFAULT_CHUNK_SIZE,
+        help="number of loans per worker task")
+    args = parser.parse_args(argv)
+
+    if args.schedules and not os.path.exists(args.schedules):
+        os.makedirs(args.schedules)
+
+    failed = 0
+    projects = []
+    loans = []
+    for file_name in args.files:
+        try:
+            file_projects = read_projects(file_name)
+        except ProjectFileError as ex:
+            # The message contains the file name
+            log.LOGGER.error(ex)
+            failed += 1
+            continue
+        except Exception as ex:
+            log.LOGGER.error("%s: %s", file_name, ex)
+            failed += 1
+            continue
+        for name, settings in file_projects:
+            try:
+                sondertilgungen = settings.sondertilgungen()
+            except ValueError as ex:
+                log.LOGGER.error("%s: %s", name, ex)
+                failed += 1
+                continue
+            projects.append((name, settings))
+            loans.append(
+                (settings.kreditsumme, settings.tilgung, settings.zins, sondertilgungen))
+    run = runner.run_portfolio(
+        loans, chunk_size=args.chunk_size, workers=args.workers or None)
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(output, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        for (name, settings), summary in zip(projects, run.results):
+            if summary is None:
+                continue
+            writer.writerow(summarize(name, settings, summary))
+            if args.schedules:
+                try:
+                    # Names from CSV files must not lead out of the directory
+                    write_schedule(
+                        name, settings,
+                        os.path.join(args.schedules, os.path.basename(name) + '.csv'))
+                except (ValueError, OSError) as ex:
+                    log.LOGGER.error("%s: %s", name, ex)
+                    failed += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if args.export:
+        errors = []
+        try:
+            export.export(
+                _schedules(
+                    (project for project, summary in zip(projects, run.results)
+                     if summary is not None),
+                    errors),
+                args.export)
+        except (OSError, ImportError) as ex:
+            log.LOGGER.error("%s: %s", args.export, ex)
+            failed += 1
+        for name, message in errors:
+            log.LOGGER.error("%s: %s", name, message)
+            failed += 1
+    for index, message in run.errors:
+        log.LOGGER.error("%s: %s", projects[index][0], message)
+        failed += 1
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
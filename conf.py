@@ -8,4 +8,6 @@ __author__ = "Sofie & Bernd Krietenstein"
 __copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
 __license__ = "see LICENSE file"
 
-DATE_FORMAT = "MM/yyyy"
\ No newline at end of file
+DATE_FORMAT = "MM/yyyy"
+# Delay of the live recalculation after the last input change in ms
+RECALC_DELAY_MS = 250
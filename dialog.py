@@ -10,7 +10,6 @@ __license__ = "see LICENSE file"
 
 import os
 import pathlib
-import yaml
 
 from PyQt5.QtWidgets import (
     QApplication,
@@ -25,38 +24,23 @@ from PyQt5.QtWidgets import (
     QPushButton,
     QFileDialog,
     QDialog,
-    QMessageBox
+    QInputDialog,
+    QMessageBox,
+    QProgressBar
 )
 from PyQt5.QtCore import (
-    QDate
+    QDate,
+    QTimer
 )
 
 import conf
 import log
-import util
+import profiling
 from kredit import AnnuitaetenKredit
-from plot import PlotWindow
-from table import TableDialog
-from soti import SotiDialog
-
-class CreditSettings(object):
-    """
-    Stores the credit settings.
-    """
-    def __init__(self,
-            kreditsumme=0.0,
-            zins=0.0,
-            tilgung=0.0,
-            start_date="01/2000",
-            extra_payments=[]):
-        """
-        C'tor.
-        """
-        self.kreditsumme = kreditsumme
-        self.zins = zins
-        self.tilgung = tilgung
-        self.start_date = start_date
-        self.extra_payments = extra_payments
+from worker import CalculationWorker, calculate_schedule
+from settings import CreditSettings, ProjectFileError, load_settings, save_settings
+# The dialogs showing the extra payments, the schedule and the chart are
+# imported when they are opened first. Especially matplotlib is slow to import.
 
 class MainDialog(QWidget):
     """
@@ -76,6 +60,7 @@ class MainDialog(QWidget):
         self._monats_rate_label = None
         self._laufzeit_label = None
         self._kosten_label = None
+        self._progress_bar = None
         self._load_button = None
         self._save_button = None
         self._calc_button = None
@@ -83,27 +68,42 @@ class MainDialog(QWidget):
         self._table_button = None
         self._table_button = None
         self._plot_button = None
+        self._sensitivity_button = None
+        self._scenario_button = None
+        self._export_button = None
         self._close_button = None
 
         self._window = None
         self._table_window = None
+        self._sensitivity_window = None
 
         self._current_project_file_name = None
         self._settings = None
+        self._kredit = None
+        self._kredit_parameter = None
         self._kredit_verlauf = []
+        self._verlauf_parameter = None # (summe, tilgung, zins, sondertilgungen) of _kredit_verlauf
+        self._worker_parameter = None # the same of the running calculation
         self._extra_payments = []
+        self._worker = None # running calculation
+        self._recalc_timer = None # restarted by every input change
         
         self.init_ui()
 
         # Load/initialize settings
         self._credit_dir = os.path.join(pathlib.Path.home(), '.credit')
-        self._credit_settings_file = os.path.join(self._credit_dir, 'settings.yaml')
+        self._credit_settings_file = os.path.join(self._credit_dir, 'settings.json')
         if not os.path.exists(self._credit_dir):
             os.makedirs(self._credit_dir)
         if not os.path.exists(self._credit_settings_file):
             self._settings = CreditSettings()
+            # Take over the settings of older versions
+            self._load_settings(os.path.join(self._credit_dir, 'settings.yaml'))
             self._save_settings(self._credit_settings_file)
         self._load_settings(self._credit_settings_file)
+        if self._settings is None:
+            # The settings file is invalid, the error was logged
+            self._settings = CreditSettings()
 
     def init_ui(self):
         self.setGeometry(300, 300, 300, 300)
@@ -123,19 +123,32 @@ class MainDialog(QWidget):
         self._soti_button.clicked.connect(self.soti_button_pressed)
         self._plot_button.clicked.connect(self.plot_button_pressed)
         self._table_button.clicked.connect(self.table_button_pressed)
+        self._sensitivity_button.clicked.connect(self.sensitivity_button_pressed)
+        self._scenario_button.clicked.connect(self.scenario_button_pressed)
+        self._export_button.clicked.connect(self.export_button_pressed)
         self._close_button.clicked.connect(self.close_button_pressed)
 
+        # Bursts of input changes update the summary only once
+        self._recalc_timer = QTimer(self)
+        self._recalc_timer.setSingleShot(True)
+        self._recalc_timer.setInterval(conf.RECALC_DELAY_MS)
+        self._recalc_timer.timeout.connect(self._update_summary)
+        self._kredit_summe_edit.textChanged.connect(self._recalc_timer.start)
+        self._tilgung_prozent_edit.textChanged.connect(self._recalc_timer.start)
+        self._zins_prozent_edit.textChanged.connect(self._recalc_timer.start)
+        self._start_month_edit.dateChanged.connect(self._recalc_timer.start)
+
         self.show()
 
     def _load_settings(self, file_name):
         if os.path.exists(file_name):
             try:
-                self._settings = yaml.load(open(file_name, 'r'))
+                self._settings = load_settings(file_name)
                 self._kredit_summe_edit.setText("{:.2f}".format(self._settings.kreditsumme))
                 self._tilgung_prozent_edit.setText("{:.2f}".format(self._settings.tilgung))
                 self._zins_prozent_edit.setText("{:.2f}".format(self._settings.zins))
                 self._start_month_edit.lineEdit().setText(self._settings.start_date)
-            except yaml.YAMLError as ex:
+            except ProjectFileError as ex:
                 log.LOGGER.error(ex)
 
     def _save_settings(self, file_name):
@@ -158,9 +171,8 @@ class MainDialog(QWidget):
             except ValueError:
                 self._settings.start_date = "2000-01-01"
             try:
-                with open(file_name, mode='w') as file:
-                    file.write(yaml.dump(self._settings))
-            except yaml.YAMLError as ex:
+                save_settings(self._settings, file_name)
+            except ProjectFileError as ex:
                 log.LOGGER.error(ex)
         else:
             QMessageBox.warning(
@@ -228,12 +240,22 @@ class MainDialog(QWidget):
         self._data_grid.addWidget(self._monats_rate_label, start_row + 0, 1)
         self._data_grid.addWidget(self._laufzeit_label, start_row + 1, 1)
         self._data_grid.addWidget(self._kosten_label, start_row + 2, 1)
+        self._progress_bar = QProgressBar()
+        self._progress_bar.setRange(0, 100)
+        self._progress_bar.hide()
+        self._data_grid.addWidget(self._progress_bar, start_row + 3, 0, 1, 2)
 
     def init_show_buttons(self):
         self._table_button = QPushButton("Show Schedue")
         self._plot_button = QPushButton("Show Chart")
+        self._sensitivity_button = QPushButton("Show Sensitivity")
+        self._scenario_button = QPushButton("Refinancing")
+        self._export_button = QPushButton("Export")
         self._hbox_buttons.addWidget(self._table_button)
         self._hbox_buttons.addWidget(self._plot_button)
+        self._hbox_buttons.addWidget(self._sensitivity_button)
+        self._hbox_buttons.addWidget(self._scenario_button)
+        self._hbox_buttons.addWidget(self._export_button)
 
     def init_close_button(self):
         self._close_button = QPushButton("Close")
@@ -297,7 +319,7 @@ class MainDialog(QWidget):
             self,
             "Open Project File",
             start_file,
-            "Credit Project Files (*.yaml)")[0]
+            "Credit Project Files (*.json *.yaml)")[0]
         self._load_settings(file_name)
         self._current_project_file_name = file_name
 
@@ -310,44 +332,193 @@ class MainDialog(QWidget):
             self,
             "Save Project File",
             start_file,
-            "Credit Project Files (*.yaml)")[0]
+            "Credit Project Files (*.json)")[0]
         self._save_settings(file_name)
         self._current_project_file_name = file_name
 
     def calc_button_pressed(self, e):
-        kredit = AnnuitaetenKredit(self.summe, self.tilgung, self.zins)
-        # Convert absolute to relative months
-        extra_payments = {}
-        for payment in self._settings.extra_payments:
-            month = util.month_diff(
-                QDate.fromString(payment[0], conf.DATE_FORMAT),
-                QDate.fromString(self._settings.start_date, conf.DATE_FORMAT))
-            extra_payments[month] = payment[1]
-        self._kredit_verlauf = kredit.berechne_kreditverlauf(extra_payments)
-        self.monatsrate = kredit.Monatsrate
-        self.laufzeit = "{0:d} Years {1:d} Months".format(
-            int(self._kredit_verlauf[-1].Monat) // 12,
-            self._kredit_verlauf[-1].Monat % 12)
-        self.kosten = kredit.GesamtKosten
+        if self._worker is not None:
+            # The button cancels the running calculation
+            self._worker.cancel()
+            return
+        try:
+            # Convert absolute to relative months
+            with profiling.timer('dialog.extra_payments'):
+                extra_payments = self._settings.sondertilgungen()
+            parameter = (self.summe, self.tilgung, self.zins)
+        except ValueError as ex:
+            QMessageBox.warning(self, "Invalid input", str(ex))
+            return
+        # Keep the calculator, while only the extra payments change. Then the
+        # schedule is recalculated from the month of the first change on.
+        if parameter != self._kredit_parameter:
+            self._kredit = AnnuitaetenKredit(*parameter)
+            self._kredit_parameter = parameter
+        # The calculation runs in the background, the calculator is not used
+        # by the dialog meanwhile.
+        self._worker = CalculationWorker(
+            calculate_schedule, self._kredit, *parameter, extra_payments)
+        self._worker_parameter = parameter + (extra_payments,)
+        self._worker.progress.connect(self._progress_bar.setValue)
+        self._worker.result.connect(self._calculation_finished)
+        self._worker.failed.connect(self._calculation_failed)
+        self._worker.cancelled.connect(self._calculation_cancelled)
+        self._calc_button.setText("Cancel")
+        self._progress_bar.setValue(0)
+        self._progress_bar.show()
+        self._worker.start()
+
+    def _calculation_done(self):
+        self._worker.wait()
+        self._worker = None
+        self._progress_bar.hide()
+        self._calc_button.setText("Calculate")
+
+    def _calculation_finished(self, kredit_verlauf):
+        self._calculation_done()
+        self._kredit_verlauf = kredit_verlauf
+        self._verlauf_parameter = self._worker_parameter
+        self._show_summary(
+            self._kredit_verlauf.Monatsrate,
+            self._kredit_verlauf[-1].Monat,
+            self._kredit_verlauf.GesamtKosten)
+
+    def _show_summary(self, monatsrate, monate, kosten):
+        """
+        :param monatsrate (float): monthly rate
+        :param monate (int): term in months
+        :param kosten (float): sum of interest payments
+        """
+        self.monatsrate = monatsrate
+        self.laufzeit = "{0:d} Years {1:d} Months".format(int(monate) // 12, monate % 12)
+        self.kosten = kosten
+
+    def _update_summary(self):
+        """
+        Updates the summary after the inputs have changed. The segmented
+        calculation does not build the schedule, its effort depends on the
+        number of extra payments only.
+        """
+        if self._settings is None:
+            return
+        self._settings.start_date = self._start_month_edit.lineEdit().text()
+        try:
+            kredit = AnnuitaetenKredit(self.summe, self.tilgung, self.zins)
+            laufzeit = len(kredit.berechne_segmentiert(self._settings.sondertilgungen()))
+        except ValueError:
+            # Incomplete input or a loan, which is never paid off
+            self._monats_rate_label.setText("...")
+            self._laufzeit_label.setText("...")
+            self._kosten_label.setText("...")
+            return
+        self._show_summary(kredit.Monatsrate, laufzeit, kredit.GesamtKosten)
+
+    def _calculation_failed(self, message):
+        self._calculation_done()
+        QMessageBox.warning(self, "Calculation failed", message)
+
+    def _calculation_cancelled(self):
+        self._calculation_done()
 
     def soti_button_pressed(self, e):
+        from soti import SotiDialog
         soti_dialog = SotiDialog(self, self._settings.extra_payments)
         ret = soti_dialog.exec()
         if ret == QDialog.Accepted:
             self._settings.extra_payments = soti_dialog.payments
+            self._recalc_timer.start()
 
     def table_button_pressed(self, e):
         if len(self._kredit_verlauf):
+            from table import TableDialog
             table_dialog = TableDialog(self)
             table_dialog.show_table(self._kredit_verlauf, self._start_month_edit.date())
             table_dialog.exec()
 
     def plot_button_pressed(self, e):
         if len(self._kredit_verlauf):
-            plot_dialog = PlotWindow(self)
-            plot_dialog.plot(self._kredit_verlauf)
-            plot_dialog.exec()
+            if self._window is None:
+                # The chart window is reused, its figure is updated in place
+                from plot import PlotWindow
+                self._window = PlotWindow(self)
+            self._window.plot(self._kredit_verlauf)
+            self._window.exec()
+
+    def sensitivity_button_pressed(self, e):
+        import numpy
+        from portfolio import berechne_raster
+        from plot import SensitivityWindow
+        try:
+            summe, tilgung, zins = self.summe, self.tilgung, self.zins
+            sondertilgungen = self._settings.sondertilgungen()
+        except ValueError as ex:
+            QMessageBox.warning(self, "Invalid input", str(ex))
+            return
+        zinsen = numpy.linspace(max(0.0, zins - 2.0), zins + 2.0, 200)
+        tilgungen = numpy.linspace(max(0.1, tilgung - 2.0), tilgung + 2.0, 200)
+        raster = berechne_raster(summe, zinsen, tilgungen, sondertilgungen)
+        if self._sensitivity_window is None:
+            self._sensitivity_window = SensitivityWindow(self)
+        self._sensitivity_window.plot(raster)
+        self._sensitivity_window.exec()
+
+    def scenario_button_pressed(self, e):
+        if not len(self._kredit_verlauf):
+            return
+        years, ok = QInputDialog.getInt(
+            self, "Refinancing", "Fixed-rate period [years]:", 10, 1, 50)
+        if not ok:
+            return
+        from szenario import simuliere_anschlussfinanzierung
+        # The parameters of the schedule, the fields may have changed since
+        _, tilgung, zins, extra_payments = self._verlauf_parameter
+        try:
+            ergebnis = simuliere_anschlussfinanzierung(
+                self._kredit_verlauf, 12 * years, zins, tilgung, seed=0,
+                sondertilgungen=extra_payments)
+        except ValueError as ex:
+            QMessageBox.warning(self, "Refinancing Scenarios", str(ex))
+            return
+        kosten = ergebnis.kosten_perzentile()
+        laufzeit = ergebnis.laufzeit_perzentile()
+        lines = ["Percentile    Total Interest    Period"]
+        for perzentil in sorted(kosten):
+            lines.append("{:>3d} %    {:>14.2f}    {:d} Years {:d} Months".format(
+                perzentil,
+                kosten[perzentil],
+                int(laufzeit[perzentil]) // 12,
+                int(laufzeit[perzentil]) % 12))
+        QMessageBox.information(self, "Refinancing Scenarios", "\n".join(lines))
+
+    def export_button_pressed(self, e):
+        if not len(self._kredit_verlauf):
+            return
+        if self._current_project_file_name:
+            start_file = os.path.splitext(self._current_project_file_name)[0] + '.csv'
+        else:
+            start_file = str(pathlib.Path.home())
+        file_name = QFileDialog.getSaveFileName(
+            self,
+            "Export Schedule",
+            start_file,
+            "CSV Files (*.csv);;Directory of NumPy Files (*)")[0]
+        if not file_name:
+            return
+        import export
+        name = os.path.splitext(os.path.basename(self._current_project_file_name or 'schedule'))[0]
+        try:
+            export.export(
+                [(name, self._start_month_edit.date(), self._kredit_verlauf)], file_name)
+        except (OSError, ImportError) as ex:
+            QMessageBox.warning(self, "Export failed", str(ex))
 
     def close_button_pressed(self):
         self._save_settings(self._credit_settings_file)
-        self.close()
\ No newline at end of file
+        self.close()
+
+    def closeEvent(self, event):
+        # Also closing by the window's title bar stops the calculation
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+        super().closeEvent(event)
\ No newline at end of file
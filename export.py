@@ -0,0 +1,208 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Export of schedules to CSV and to columnar NumPy files.
+
+The schedules are written chunk by chunk, so an export of a large portfolio
+never sits in memory completely, if the schedules are passed as generators,
+e.g. of AnnuitaetenKredit.iter_kreditverlauf.
+
+The NumPy export is a directory with one .npy file per column of
+EXPORT_COLUMNS and the names of the schedules in names.json. Every column
+can be memory mapped:
+
+    restschuld = numpy.load('export/Restschuld.npy', mmap_mode='r')
+
+Does not need PyQt5. numpy is needed for the NumPy export only.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import csv
+import json
+import os
+import struct
+
+import util
+from kredit import SPALTEN, Kreditverlauf
+
+# Kredit: index of the schedule, Datum: year * 100 + month
+EXPORT_COLUMNS = ('Kredit', 'Datum') + SPALTEN
+CHUNK_ROWS = 65536 # rows per write
+
+_NPY_TYPES = {
+    'Kredit': '<i4',
+    'Datum': '<i4',
+    'Monat': '<i4',
+    'Zinsanteil': '<f8',
+    'Tilgungsanteil': '<f8',
+    'Sondertilgungsanteil': '<f8',
+    'Restschuld': '<f8'}
+_NPY_HEADER_SIZE = 128 # bytes, incl. magic string and length
+
+
+def _start(start_date):
+    """
+    :param start_date (str MM/yyyy, QDate, datetime.date or tuple (year, month))
+    :returns: month index 12 * year + month - 1 of the first month
+    :rtype: int
+    """
+    if isinstance(start_date, str):
+        start_date = util.parse_month(start_date)
+    return util.month_index(start_date)
+
+
+def _chunks(schedules):
+    """
+    Splits schedules into chunks of rows.
+
+    :param schedules (iterable of (name, start_date, schedule)): see export_csv
+    :returns: generator of (index, name, start, columns). columns is a tuple of
+              sequences, one per column of SPALTEN. start is the month index
+              of the first month of the schedule.
+    """
+    for index, (name, start_date, verlauf) in enumerate(schedules):
+        start = _start(start_date)
+        if isinstance(verlauf, Kreditverlauf):
+            spalten = tuple(verlauf.spalte(spalte) for spalte in SPALTEN)
+            for first in range(0, len(verlauf), CHUNK_ROWS):
+                yield index, name, start, tuple(
+                    spalte[first:first + CHUNK_ROWS] for spalte in spalten)
+            continue
+        rows = []
+        for zwischenstand in verlauf:
+            rows.append((
+                zwischenstand.Monat,
+                zwischenstand.Zinsanteil,
+                zwischenstand.Tilgungsanteil,
+                zwischenstand.Sondertilgungsanteil,
+                zwischenstand.Restschuld))
+            if len(rows) == CHUNK_ROWS:
+                yield index, name, start, tuple(zip(*rows))
+                rows = []
+        if rows:
+            yield index, name, start, tuple(zip(*rows))
+
+
+def export_csv(schedules, file_name):
+    """
+    Writes schedules into one CSV file. The columns are name, date (MM/yyyy)
+    and SPALTEN.
+
+    :param schedules (iterable of (name, start_date, schedule)): name (str),
+           start date (str MM/yyyy, QDate, datetime.date or tuple (year,
+           month)) and schedule (Kreditverlauf or iterable of
+           KreditverlaufsZwischenstand objects)
+    :param file_name (str): path of the CSV file
+    :returns: number of rows
+    :rtype: int
+    """
+    count = 0
+    with open(file_name, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('Name', 'Datum') + SPALTEN)
+        for _, name, start, (monat, zins, tilgung, soti, rest) in _chunks(schedules):
+            dates = util.format_months(start + m - 1 for m in monat)
+            writer.writerows(
+                (name,
+                 date,
+                 m,
+                 "{:.2f}".format(z),
+                 "{:.2f}".format(t),
+                 "{:.2f}".format(s),
+                 "{:.2f}".format(r))
+                for date, m, z, t, s, r in zip(dates, monat, zins, tilgung, soti, rest))
+            count += len(monat)
+    return count
+
+
+def _npy_header(dtype, rows):
+    """
+    Header of a one-dimensional .npy file (format version 1.0). It has a fixed
+    size, so it can be overwritten, when the number of rows is known.
+    """
+    import numpy
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        numpy.lib.format.dtype_to_descr(numpy.dtype(dtype)), rows)
+    header = header.ljust(_NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+def export_npy(schedules, directory):
+    """
+    Writes schedules into one .npy file per column of EXPORT_COLUMNS and the
+    names into names.json.
+
+    :param schedules (iterable of (name, start_date, schedule)): see export_csv
+    :param directory (str): path of the directory, created if missing
+    :returns: number of rows
+    :rtype: int
+    """
+    import numpy
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    files = {
+        column: open(os.path.join(directory, column + '.npy'), 'wb')
+        for column in EXPORT_COLUMNS}
+    names = []
+    def named(schedules):
+        for schedule in schedules:
+            names.append(schedule[0])
+            yield schedule
+
+    count = 0
+    try:
+        for column, file in files.items():
+            file.write(_npy_header(_NPY_TYPES[column], 0))
+        for index, _, start, spalten in _chunks(named(schedules)):
+            monat = numpy.asarray(spalten[0], dtype=_NPY_TYPES['Monat'])
+            monatsindex = start + monat - 1
+            werte = dict(zip(SPALTEN, spalten))
+            werte['Kredit'] = numpy.full(len(monat), index)
+            werte['Datum'] = (monatsindex // 12) * 100 + monatsindex % 12 + 1
+            for column, file in files.items():
+                file.write(numpy.asarray(werte[column], dtype=_NPY_TYPES[column]).tobytes())
+            count += len(monat)
+        for column, file in files.items():
+            file.seek(0)
+            file.write(_npy_header(_NPY_TYPES[column], count))
+    finally:
+        for file in files.values():
+            file.close()
+    with open(os.path.join(directory, 'names.json'), 'w') as file:
+        json.dump(names, file)
+    return count
+
+
+def export(schedules, file_name):
+    """
+    Writes schedules into a CSV file or a directory of .npy files.
+
+    :param schedules (iterable of (name, start_date, schedule)): see export_csv
+    :param file_name (str): path of a .csv file or a directory
+    :returns: number of rows
+    :rtype: int
+    """
+    if file_name.lower().endswith('.csv'):
+        return export_csv(schedules, file_name)
+    return export_npy(schedules, file_name)
+
+
+def load_npy(directory):
+    """
+    Memory maps a NumPy export.
+
+    :param directory (str): path of the directory
+    :returns: key: column of EXPORT_COLUMNS or 'names', value: read-only
+              memory mapped column or list of names
+    :rtype: dict
+    """
+    import numpy
+    result = {
+        column: numpy.load(os.path.join(directory, column + '.npy'), mmap_mode='r')
+        for column in EXPORT_COLUMNS}
+    with open(os.path.join(directory, 'names.json')) as file:
+        result['names'] = json.load(file)
+    return result
@@ -8,10 +8,51 @@ __author__ = "Sofie & Bernd Krietenstein"
 __copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
 __license__ = "see LICENSE file"
 
+import bisect
+import math
+import sys
+from array import array
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP
+from fractions import Fraction
+
+import profiling
+
+CHECKPOINT_INTERVALL = 12 # months between two checkpoints
+RESTSCHULD_TOLERANZ = 1e-9 # smaller balances per loan amount are rounding errors
+
+# byte order prefix of native buffer formats
+_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
+
+SPALTEN = (
+    'Monat',
+    'Zinsanteil',
+    'Tilgungsanteil',
+    'Sondertilgungsanteil',
+    'Restschuld')
+
+def _passt(puffer, spalte):
+    """
+    :param puffer (memoryview): a column passed to Kreditverlauf.aus_puffern
+    :param spalte (array): the column of the schedule
+    :returns: True, if the buffer holds numbers of the type of the column,
+              i.e. integers or floats of the same size in native byte order
+    :rtype: bool
+    """
+    typ = puffer.format
+    if typ[:1] in ('@', '=', _BYTEORDER):
+        typ = typ[1:]
+    if len(typ) != 1 or typ in '?cx' or puffer.itemsize != spalte.itemsize:
+        return False
+    ganzzahlig = 'bBhHiIlLqQnN'
+    return (typ in ganzzahlig) == (spalte.typecode in ganzzahlig)
+
+
 class KreditverlaufsZwischenstand(object):
     """
     One line in a credit schedule.
     """
+    __slots__ = SPALTEN
+
     def __init__(self, monat, zins, tilgung, soti, restschuld):
         """
         C'tor.
@@ -29,21 +70,373 @@ class KreditverlaufsZwischenstand(object):
         self.Restschuld = restschuld
 
 
+class Kreditverlauf(object):
+    """
+    Credit schedule. The values are stored column by column in typed arrays,
+    rows are created on access.
+    """
+    def __init__(self):
+        """
+        C'tor. Creates an empty schedule.
+        """
+        self._spalten = (
+            array('i'), # Monat
+            array('d'), # Zinsanteil
+            array('d'), # Tilgungsanteil
+            array('d'), # Sondertilgungsanteil
+            array('d')) # Restschuld
+        self._eingefroren = False
+
+    @classmethod
+    def aus_puffern(cls, monat, zins, tilgung, soti, restschuld):
+        """
+        Creates a schedule from complete columns.
+
+        :param monat: numbers of month, buffer of C ints (e.g. int32 ndarray)
+        :param zins: interest parts, buffer of doubles
+        :param tilgung: redemption parts, buffer of doubles
+        :param soti: extra payments, buffer of doubles
+        :param restschuld: balances, buffer of doubles
+        :rtype: Kreditverlauf
+        """
+        verlauf = cls()
+        for spalte, puffer in zip(verlauf._spalten, (monat, zins, tilgung, soti, restschuld)):
+            puffer = memoryview(puffer)
+            if not _passt(puffer, spalte):
+                raise ValueError("Column has format {!r} of item size {}, expected {!r}".format(
+                    puffer.format, puffer.itemsize, spalte.typecode))
+            spalte.frombytes(puffer.cast('B'))
+        if len(set(len(spalte) for spalte in verlauf._spalten)) > 1:
+            raise ValueError("Columns must be of equal length")
+        return verlauf
+
+    def anhaengen(self, monat, zins, tilgung, soti, restschuld):
+        """
+        Appends a row.
+
+        :param monat (int): number of month in a credit schedule
+        :param zins (float): interest part of this month's rate.
+        :param tilgung (float): redemption part of this month's rate.
+        :param soti (float): extra payment in this month.
+        :param restschuld (float): Current balance after this month's rate was paid.
+        :raises TypeError: if the schedule is frozen.
+        :raises BufferError: if a view of a column returned by spalte is
+                still alive. The schedule is not changed then.
+        """
+        if self._eingefroren:
+            raise TypeError("Schedule is frozen")
+        spalten = self._spalten
+        try:
+            spalten[0].append(monat)
+            spalten[1].append(zins)
+            spalten[2].append(tilgung)
+            spalten[3].append(soti)
+            spalten[4].append(restschuld)
+        except BufferError:
+            # The columns, which were extended, have no views
+            laenge = min(len(spalte) for spalte in spalten)
+            for spalte in spalten:
+                if len(spalte) > laenge:
+                    spalte.pop()
+            raise
+
+    def spalte(self, name):
+        """
+        Column as a view without copy. It can be passed e.g. to numpy.asarray
+        or matplotlib directly.
+
+        :param name (str): one of SPALTEN
+        :rtype: memoryview, read-only if the schedule is frozen.
+        """
+        spalte = memoryview(self._spalten[SPALTEN.index(name)])
+        return spalte.toreadonly() if self._eingefroren else spalte
+
+    def einfrieren(self):
+        """
+        Makes the schedule immutable, so it can be shared safely.
+
+        :returns: self
+        :rtype: Kreditverlauf
+        """
+        self._eingefroren = True
+        return self
+
+    @property
+    def eingefroren(self):
+        """
+        True, if the schedule is immutable.
+        """
+        return self._eingefroren
+
+    def __len__(self):
+        return len(self._spalten[0])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            verlauf = Kreditverlauf()
+            verlauf._spalten = tuple(spalte[index] for spalte in self._spalten)
+            return verlauf
+        return KreditverlaufsZwischenstand(*(spalte[index] for spalte in self._spalten))
+
+    def __iter__(self):
+        for werte in zip(*self._spalten):
+            yield KreditverlaufsZwischenstand(*werte)
+
+    @property
+    def Laufzeit(self):
+        """
+        Number of months.
+        """
+        return self._spalten[0][-1] if len(self) else 0
+
+    @property
+    def GesamtKosten(self):
+        """
+        Sum of interest payments.
+        """
+        return sum(self._spalten[1])
+
+    @property
+    def Monatsrate(self):
+        """
+        Monthly rate.
+        """
+        return self._spalten[1][0] + self._spalten[2][0]
+
+
+def _restschuld(restschuld, rate, q, monate):
+    """
+    Balance of an annuity after some months without extra payments.
+
+    :param restschuld (float): balance at the beginning
+    :param rate (float): monthly rate
+    :param q (float): monthly interest (nominal interest / 12)
+    :param monate (int): number of months
+    :rtype: float
+    """
+    if q == 0.0:
+        return restschuld - rate * monate
+    return restschuld - (rate - restschuld * q) * math.expm1(monate * math.log1p(q)) / q
+
+
+def _tilgungsmonate(restschuld, rate, q):
+    """
+    Number of months an annuity without extra payments needs to pay off
+    the balance.
+
+    :param restschuld (float): balance at the beginning
+    :param rate (float): monthly rate
+    :param q (float): monthly interest (nominal interest / 12)
+    :return: number of months or None, if the balance never gets paid off.
+    :rtype: int
+    """
+    # Redemptions of the order of rounding errors never pay off the balance
+    if rate - restschuld * q <= 1e-12 * rate:
+        return None
+    if q == 0.0:
+        monate = math.ceil(restschuld / rate)
+    else:
+        monate = math.ceil(
+            math.log1p(restschuld * q / (rate - restschuld * q)) / math.log1p(q))
+    # Correct rounding errors of the logarithms
+    monate = max(monate, 1)
+    while monate > 1 and _restschuld(restschuld, rate, q, monate - 1) <= 0:
+        monate -= 1
+    while _restschuld(restschuld, rate, q, monate) > 0:
+        monate += 1
+    return monate
+
+
+class KreditverlaufsSegment(object):
+    """
+    Months between two extra payments or interest changes. Within a segment
+    the balance follows a geometric series.
+    """
+    def __init__(self, monat, anzahl, restschuld, soti, rate, q):
+        """
+        C'tor.
+
+        :param monat (int): first month of the segment
+        :param anzahl (int): number of months in the segment
+        :param restschuld (float): balance before the first month
+        :param soti (float): extra payment in the first month
+        :param rate (float): monthly rate within the segment
+        :param q (float): monthly interest (nominal interest / 12) within
+               the segment
+        """
+        self.Monat = monat
+        self.Anzahl = anzahl
+        self.Restschuld = restschuld
+        self.Sondertilgungsanteil = soti
+        self.Monatsrate = rate
+        self.Monatszins = q
+
+
+class SegmentierterKreditverlauf(object):
+    """
+    Schedule of an annuity loan stored as segments between extra payments
+    and interest changes. Rows are calculated only on access, the totals are
+    known without them.
+    """
+    def __init__(self, segmente, laufzeit, zges):
+        """
+        C'tor.
+
+        :param segmente (list of KreditverlaufsSegment objects): the segments
+        :param laufzeit (int): number of months
+        :param zges (float): sum of interest
+        """
+        self._segmente = segmente
+        self._starts = [segment.Monat for segment in segmente]
+        self.Laufzeit = laufzeit
+        self.GesamtKosten = zges
+
+    @property
+    def segmente(self):
+        """
+        :rtype: list of KreditverlaufsSegment objects
+        """
+        return self._segmente
+
+    def __len__(self):
+        return self.Laufzeit
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.Laufzeit
+        if not 0 <= index < self.Laufzeit:
+            raise IndexError("month out of range")
+        monat = index + 1
+        if not self._segmente:
+            return KreditverlaufsZwischenstand(monat, 0.0, 0.0, 0.0, 0.0)
+        segment = self._segmente[bisect.bisect_right(self._starts, monat) - 1]
+        if monat == segment.Monat:
+            return self._zwischenstand(
+                monat, segment.Restschuld, segment.Sondertilgungsanteil, segment)
+        rate, q = segment.Monatsrate, segment.Monatszins
+        nach_erstem = segment.Restschuld * (1 + q) - rate - segment.Sondertilgungsanteil
+        restschuld = _restschuld(nach_erstem, rate, q, monat - segment.Monat - 1)
+        return self._zwischenstand(monat, restschuld, 0.0, segment)
+
+    def __iter__(self):
+        for index in range(self.Laufzeit):
+            yield self[index]
+
+    def _zwischenstand(self, monat, restschuld, soti, segment):
+        """
+        Row of a month.
+
+        :param monat (int): number of month
+        :param restschuld (float): balance before the month
+        :param soti (float): extra payment in the month
+        :param segment (KreditverlaufsSegment): segment of the month
+        :rtype: KreditverlaufsZwischenstand
+        """
+        zins = restschuld * segment.Monatszins
+        tilgung = segment.Monatsrate - zins + soti
+        if tilgung > restschuld:
+            tilgung = restschuld
+        return KreditverlaufsZwischenstand(
+            monat, zins, tilgung - soti, soti, restschuld - tilgung)
+
+    @property
+    def Monatsrate(self):
+        """
+        Monthly rate.
+        """
+        return self[0].Zinsanteil + self[0].Tilgungsanteil
+
+    def kreditverlauf(self):
+        """
+        Calculates all rows.
+
+        :rtype: Kreditverlauf
+        """
+        verlauf = Kreditverlauf()
+        for zwischenstand in self:
+            verlauf.anhaengen(
+                zwischenstand.Monat,
+                zwischenstand.Zinsanteil,
+                zwischenstand.Tilgungsanteil,
+                zwischenstand.Sondertilgungsanteil,
+                zwischenstand.Restschuld)
+        return verlauf
+
+
+def _zinsaenderungen(zinsaenderungen):
+    """
+    Normalizes interest changes.
+
+    :param zinsaenderungen (dict): key: month, value: new nominal interest in %
+           or tuple (nominal interest in %, redemption rate in %). The change
+           applies from month key + 1 like an extra payment. With a redemption
+           rate the monthly rate is recalculated from the balance before that
+           month, otherwise the monthly rate is kept. A change of month 0
+           replaces the initial values, see _startwerte.
+    :returns: key: month (>= 0), value: (interest, redemption rate or None)
+    :rtype: dict of (int, tuple)
+    :raises ValueError: if a month is negative.
+    """
+    ergebnis = {}
+    for monat, aenderung in (zinsaenderungen or {}).items():
+        if monat < 0:
+            raise ValueError("Interest change in month {} before the start".format(monat))
+        if isinstance(aenderung, (tuple, list)):
+            zins, tilgung = aenderung
+        else:
+            zins, tilgung = aenderung, None
+        ergebnis[int(monat)] = (zins, tilgung)
+    return ergebnis
+
+
+def _startwerte(tilgung, zins, aenderung, zahl=float):
+    """
+    Applies an interest change of month 0, which is valid from the first
+    month on. Without a redemption rate the first monthly rate is that of the
+    initial values, so the redemption rate takes the difference of the
+    interests.
+
+    :param tilgung: initial redemption rate in %
+    :param zins: initial nominal interest in %
+    :param aenderung (tuple): (interest, redemption rate or None) or None
+    :param zahl (callable): conversion of the values
+    :returns: redemption rate and nominal interest of the first month in %
+    :rtype: tuple
+    """
+    if aenderung is None:
+        return zahl(tilgung), zahl(zins)
+    neuer_zins, neue_tilgung = aenderung
+    if neue_tilgung is None:
+        return zahl(tilgung) + zahl(zins) - zahl(neuer_zins), zahl(neuer_zins)
+    return zahl(neue_tilgung), zahl(neuer_zins)
+
+
 class AnnuitaetenKredit(object):
     """
     Calulator for annuity loans.
     """
 
-    def __init__(self, betrag, tilgung, zins):
+    def __init__(self, betrag, tilgung, zins, zinsaenderungen=None):
         """
         Initializes the annuity loan calcuator
 
         :param betrag (float): loan amount
         :param tilgung (float): redemption rate in %
         :param zins (float): nominal interest in %
+        :param zinsaenderungen (dict): Interest changes. key: month, value:
+               new nominal interest in % or tuple (nominal interest in %,
+               redemption rate in %), see _zinsaenderungen.
         """
+        self._zinsaenderungen = {}
+        if zinsaenderungen:
+            zinsaenderungen = _zinsaenderungen(zinsaenderungen)
+            tilgung, zins = _startwerte(tilgung, zins, zinsaenderungen.pop(0, None))
+            self._zinsaenderungen = {
+                monat: (float(zins) / 100.0, None if tilgung is None else float(tilgung) / 100.0)
+                for monat, (zins, tilgung) in zinsaenderungen.items()}
         self._t0 = tilgung / 100.0
-        self._z = zins / 100.0
+        self._z0 = zins / 100.0
+        self._z = self._z0 # current nominal interest
         self._s0 = betrag
 
         self._zges = 0.0 # sum of interest
@@ -53,8 +446,11 @@ class AnnuitaetenKredit(object):
         self._stil = 0.0 # extra redemption
         self._mzins = 0.0 # current interest amount
         self._s  = self._s0 # balance
+        self._rate = 0.0 # monthly rate of the first month
 
-        self._verlauf = [] # list of KreditverlaufsZwischenstand objects
+        self._verlauf = Kreditverlauf()
+        self._sondertilgungen = None # extra payments of self._verlauf
+        self._checkpoints = [] # states at the beginning of every CHECKPOINT_INTERVALL months
 
     def _monatsschritt(self, sondertilgung=0.0):
         """
@@ -80,32 +476,261 @@ class AnnuitaetenKredit(object):
             # self._teff = self._mtil / self._s0 * 12
             self._s = self._s - self._mtil
             self._zges = self._zges + self._mzins
+        # A balance of the order of rounding errors, e.g. at 0 % interest, is
+        # paid off like by berechne_segmentiert
+        if self._s < RESTSCHULD_TOLERANZ * self._s0:
+            self._mtil += self._s
+            self._s = 0.0
 
-    def berechne_kreditverlauf(self, sondertilgungen={}):
+    def _reset(self):
         """
-        Calculate schedule.
+        Resets the state to the beginning of the schedule.
+        """
+        self._zges = 0.0
+        self._m = 1
+        self._ms = 0.0
+        self._mtil = 0.0
+        self._stil = 0.0
+        self._mzins = 0.0
+        self._s = self._s0
+        self._rate = 0.0
+        self._z = self._z0
+
+    def _checkpoint(self):
+        """
+        :returns: state at the beginning of the current month
+        :rtype: tuple
+        """
+        return (self._m, self._s, self._zges, self._ms, self._rate, self._z)
+
+    def _restore(self, checkpoint):
+        """
+        Restores a state.
+
+        :param checkpoint (tuple): state returned by _checkpoint
+        """
+        self._m, self._s, self._zges, self._ms, self._rate, self._z = checkpoint
+
+    def _zins_aendern(self, zins, tilgung):
+        """
+        Changes the interest from the current month on.
+
+        :param zins (float): nominal interest as fraction
+        :param tilgung (float): redemption rate as fraction, None to keep the
+               monthly rate
+        """
+        self._z = zins
+        if tilgung is not None:
+            self._ms = self._s * (tilgung + self._z) / 12
+
+    def _iter_werte(self, sondertilgungen, checkpoint=None, checkpoints=None, fortschritt=None):
+        """
+        Calculate schedule month by month.
 
         :param sondertilgungen (dict of (int,float)): Extra payments.
                key: month, value: amount.
-        :return: schedule. A KreditverlaufsZwischenstand object is created for
-                 each month containing the values
+        :param checkpoint (tuple): state to start from, None to start from the
+               beginning
+        :param checkpoints (list): if given, states are appended every
+               CHECKPOINT_INTERVALL months
+        :param fortschritt (callable): if given, called with the current month
+               every CHECKPOINT_INTERVALL months. It may raise an exception to
+               stop the calculation.
+        :return: generator of tuples
                  (month, interest, redemption, extra payment, balance)
-        :rtype: list of KreditverlaufsZwischenstand objects.
+        :raises ValueError: if the loan is never paid off.
         """
-        self._m = 1
-        if self._s == 0.0:
-            self._verlauf.append(
-                KreditverlaufsZwischenstand(
-                    self._m, 0.0, 0.0, 0.0, 0.0))
+        if checkpoint is None:
+            self._reset()
+            if self._s == 0.0:
+                yield (self._m, 0.0, 0.0, 0.0, 0.0)
+        else:
+            self._restore(checkpoint)
+        zinsaenderungen = self._zinsaenderungen
+        # Without redemption only extra payments and interest changes reduce
+        # the balance, so the check waits for the last of them
+        letzte_sondertilgung = max(
+            max(sondertilgungen, default=-1), max(zinsaenderungen, default=-1))
         while self._s > 0:
+            if (self._m - 1) % CHECKPOINT_INTERVALL == 0:
+                if checkpoints is not None:
+                    checkpoints.append(self._checkpoint())
+                if fortschritt is not None:
+                    fortschritt(self._m)
+            if self._m - 1 in zinsaenderungen:
+                self._zins_aendern(*zinsaenderungen[self._m - 1])
             if self._m - 1 in sondertilgungen:
                 self._monatsschritt(sondertilgungen[self._m - 1])
             else:
                 self._monatsschritt()
-            self._verlauf.append(
-                KreditverlaufsZwischenstand(
-                    self._m, self._mzins, self._mtil - self._stil, self._stil, self._s))
+            if self._m == 1:
+                self._rate = self._mzins + self._mtil - self._stil
+            # The redemption of the next month
+            if (self._s > 0 and self._m > letzte_sondertilgung
+                    and self._ms - self._s * self._z / 12 <= 1e-12 * self._ms):
+                raise ValueError("Loan is never paid off")
+            yield (self._m, self._mzins, self._mtil - self._stil, self._stil, self._s)
             self._m += 1
+
+    def iter_kreditverlauf(self, sondertilgungen={}):
+        """
+        Calculate schedule month by month. The rows are yielded as soon as
+        they are calculated and are not kept, so memory does not grow with the
+        term. GesamtKosten covers the months yielded so far.
+
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :return: generator of KreditverlaufsZwischenstand objects.
+        """
+        self._sondertilgungen = None
+        for werte in self._iter_werte(sondertilgungen):
+            yield KreditverlaufsZwischenstand(*werte)
+
+    @profiling.timed('engine.berechne_kreditverlauf')
+    def berechne_kreditverlauf(self, sondertilgungen={}, fortschritt=None):
+        """
+        Calculate schedule.
+
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :param fortschritt (callable): if given, called with the current month
+               every CHECKPOINT_INTERVALL months. It may raise an exception to
+               stop the calculation.
+        :return: schedule. It contains a row for each month containing the
+                 values (month, interest, redemption, extra payment, balance)
+        :rtype: Kreditverlauf
+        :raises ValueError: if the loan is never paid off.
+        """
+        self._verlauf = Kreditverlauf()
+        # Set after success only, an aborted schedule is not updated later
+        self._sondertilgungen = None
+        sondertilgungen = dict(sondertilgungen)
+        self._checkpoints = []
+        anhaengen = self._verlauf.anhaengen
+        for werte in self._iter_werte(
+                sondertilgungen, checkpoints=self._checkpoints, fortschritt=fortschritt):
+            anhaengen(*werte)
+        self._sondertilgungen = sondertilgungen
+        profiling.count('engine.months', len(self._verlauf))
+        return self._verlauf
+
+    @profiling.timed('engine.aktualisiere_kreditverlauf')
+    def aktualisiere_kreditverlauf(self, sondertilgungen={}, fortschritt=None):
+        """
+        Recalculate schedule after the extra payments have been changed. The
+        calculation restarts from the latest checkpoint before the earliest
+        changed month. Schedules returned before are not modified.
+
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :param fortschritt (callable): see berechne_kreditverlauf
+        :return: schedule, same as berechne_kreditverlauf
+        :rtype: Kreditverlauf
+        :raises ValueError: if the loan is never paid off.
+        """
+        if self._sondertilgungen is None or not self._checkpoints:
+            return self.berechne_kreditverlauf(sondertilgungen, fortschritt)
+        alt = self._sondertilgungen
+        geaendert = [
+            monat for monat in set(alt) | set(sondertilgungen)
+            if alt.get(monat) != sondertilgungen.get(monat)]
+        sondertilgungen = dict(sondertilgungen)
+        if not geaendert:
+            return self._verlauf
+        # An extra payment with key k is paid in month k + 1
+        erster_monat = max(min(geaendert) + 1, 1)
+        if erster_monat > len(self._verlauf):
+            # Paid off before the change
+            self._sondertilgungen = sondertilgungen
+            return self._verlauf
+
+        index = bisect.bisect_right(
+            [checkpoint[0] for checkpoint in self._checkpoints], erster_monat) - 1
+        checkpoint = self._checkpoints[index]
+        del self._checkpoints[index:]
+        self._verlauf = self._verlauf[:checkpoint[0] - 1]
+        # Set after success only, an aborted schedule is not updated later
+        self._sondertilgungen = None
+        anhaengen = self._verlauf.anhaengen
+        for werte in self._iter_werte(
+                sondertilgungen, checkpoint,
+                checkpoints=self._checkpoints, fortschritt=fortschritt):
+            anhaengen(*werte)
+        self._sondertilgungen = sondertilgungen
+        profiling.count('engine.months', len(self._verlauf) - checkpoint[0] + 1)
+        return self._verlauf
+
+    @profiling.timed('engine.berechne_segmentiert')
+    def berechne_segmentiert(self, sondertilgungen={}):
+        """
+        Calculate schedule analytically. The effort depends on the number of
+        extra payments and interest changes only, not on the term of the
+        loan. The term equals that of berechne_kreditverlauf, which pays off
+        balances below RESTSCHULD_TOLERANZ, the amounts are equal up to
+        rounding errors.
+
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :return: schedule. Rows are calculated on access.
+        :rtype: SegmentierterKreditverlauf
+        :raises ValueError: if the loan is never paid off.
+        """
+        self._sondertilgungen = None
+        zinsaenderungen = self._zinsaenderungen
+        z = self._z0
+        q = z / 12
+        rate = (self._s0 * self._t0 + self._s0 * z) / 12
+        # Segments start with an extra payment or an interest change
+        wechsel = sorted(set(monat + 1 for monat in sondertilgungen if monat >= 0))
+        if zinsaenderungen:
+            wechsel = sorted(set(wechsel).union(monat + 1 for monat in zinsaenderungen))
+        segmente = []
+        zges = 0.0
+        restschuld = self._s0
+        monat = 1
+        laufzeit = 1 if restschuld == 0.0 else 0
+        naechste = bisect.bisect_left(wechsel, monat)
+        while restschuld > 0:
+            soti = sondertilgungen[monat - 1] if monat - 1 in sondertilgungen else 0.0
+            if monat - 1 in zinsaenderungen:
+                z, tilgung = zinsaenderungen[monat - 1]
+                q = z / 12
+                if tilgung is not None:
+                    rate = restschuld * (tilgung + z) / 12
+            if naechste < len(wechsel) and wechsel[naechste] == monat:
+                naechste += 1
+            ende = wechsel[naechste] if naechste < len(wechsel) else None
+
+            # First month of the segment contains the extra payment.
+            nach_erstem = restschuld * (1 + q) - rate - soti
+            if nach_erstem <= 0:
+                segmente.append(KreditverlaufsSegment(monat, 1, restschuld, soti, rate, q))
+                zges += restschuld * q
+                laufzeit = monat
+                break
+            monate = _tilgungsmonate(nach_erstem, rate, q)
+            if ende is None and monate is None:
+                raise ValueError("Loan is never paid off")
+            if monate is not None and (ende is None or monat + monate < ende):
+                # Paid off within this segment
+                vor_letztem = _restschuld(nach_erstem, rate, q, monate - 1)
+                segmente.append(
+                    KreditverlaufsSegment(monat, monate + 1, restschuld, soti, rate, q))
+                zges += rate * monate + soti - (restschuld - vor_letztem) + vor_letztem * q
+                laufzeit = monat + monate
+                break
+            anzahl = ende - monat
+            segment_ende = _restschuld(nach_erstem, rate, q, anzahl - 1)
+            segmente.append(KreditverlaufsSegment(monat, anzahl, restschuld, soti, rate, q))
+            zges += rate * anzahl + soti - (restschuld - segment_ende)
+            restschuld = segment_ende
+            monat = ende
+
+        self._zges = zges
+        self._rate = 0.0
+        self._verlauf = SegmentierterKreditverlauf(segmente, laufzeit, zges)
+        if segmente:
+            self._rate = self._verlauf.Monatsrate
         return self._verlauf
 
     @property
@@ -120,4 +745,241 @@ class AnnuitaetenKredit(object):
         """
         Monthly rate.
         """
-        return self._verlauf[0].Zinsanteil + self._verlauf[0].Tilgungsanteil
+        return self._rate
+
+
+def _runde(zaehler, nenner, rundung):
+    """
+    Rounds zaehler / nenner to an integer without floating point arithmetic.
+
+    :param zaehler (int): numerator
+    :param nenner (int): positive denominator
+    :param rundung (str): ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN or
+           ROUND_UP of the decimal module. Ties and directions refer to
+           the absolute value.
+    :rtype: int
+    """
+    if zaehler < 0:
+        return -_runde(-zaehler, nenner, rundung)
+    ganz, rest = divmod(zaehler, nenner)
+    if rest == 0 or rundung == ROUND_DOWN:
+        return ganz
+    if rundung == ROUND_UP:
+        return ganz + 1
+    doppelt = 2 * rest
+    if doppelt > nenner or (doppelt == nenner and (rundung == ROUND_HALF_UP or ganz % 2)):
+        return ganz + 1
+    return ganz
+
+
+def in_cent(betrag):
+    """
+    Converts an amount in Euro to cents. Floats are taken by their shortest
+    representation, i.e. 0.1 is 10 cents.
+
+    :param betrag (float, int, str or Decimal): the amount
+    :rtype: int
+    """
+    return int((Decimal(str(betrag)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+class CentKredit(AnnuitaetenKredit):
+    """
+    Annuity loan calculator with amounts in integer cents. The monthly rate
+    and the interest of every month are rounded to cents by an explicit rule,
+    the balance is exact. So the schedule is reproducible and matches bank
+    statements, which use the same rule. Integer arithmetic is faster than
+    decimal.Decimal.
+
+    The schedule is returned in Euro like by AnnuitaetenKredit. Its values
+    are the nearest floats to the cent amounts.
+    """
+
+    def __init__(self, betrag, tilgung, zins, zinsaenderungen=None, *, rundung=ROUND_HALF_UP):
+        """
+        Initializes the calculator.
+
+        :param betrag (float, int, str or Decimal): loan amount in Euro
+        :param tilgung (float, str or Decimal): redemption rate in %
+        :param zins (float, str or Decimal): nominal interest in %
+        :param zinsaenderungen (dict): interest changes, see
+               AnnuitaetenKredit. Recalculated monthly rates are rounded like
+               the first one.
+        :param rundung (str): rounding of monthly rate and interest,
+               ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN or ROUND_UP of the
+               decimal module. Keyword only.
+        """
+        if rundung not in (ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN, ROUND_UP):
+            raise ValueError("Unknown rounding {}".format(rundung))
+        zinsaenderungen = _zinsaenderungen(zinsaenderungen)
+        super(CentKredit, self).__init__(
+            float(betrag), float(tilgung), float(zins), zinsaenderungen)
+        self._rundung = rundung
+        self._s0_cent = in_cent(betrag)
+        # Monthly interest and monthly rate as exact fractions
+        tilgung, zins = _startwerte(
+            tilgung, zins, zinsaenderungen.pop(0, None), lambda wert: Fraction(str(wert)))
+        self._q0 = zins / 1200
+        self._r = (tilgung + zins) / 1200
+        # key: month, value: (monthly interest, monthly rate per balance or None)
+        self._cent_aenderungen = {
+            monat: (Fraction(str(zins)) / 1200,
+                    None if tilgung is None
+                    else (Fraction(str(tilgung)) + Fraction(str(zins))) / 1200)
+            for monat, (zins, tilgung) in zinsaenderungen.items()}
+        self._reset()
+
+    def _zins_abc(self, q):
+        """
+        Except for ROUND_HALF_EVEN the rounded interest of the balance s is
+        (s * a + b) // c for positive interest.
+
+        :param q (Fraction): monthly interest
+        :returns: (a, b, c) or None
+        :rtype: tuple
+        """
+        zaehler, nenner = q.numerator, q.denominator
+        if zaehler < 0:
+            return None
+        if self._rundung == ROUND_HALF_UP:
+            return (2 * zaehler, nenner, 2 * nenner)
+        if self._rundung == ROUND_DOWN:
+            return (zaehler, 0, nenner)
+        if self._rundung == ROUND_UP:
+            return (zaehler, nenner - 1, nenner)
+        return None
+
+    def _reset(self):
+        """
+        Resets the state to the beginning of the schedule.
+        """
+        self._zges = 0
+        self._m = 1
+        self._ms = 0
+        self._mtil = 0
+        self._stil = 0
+        self._mzins = 0
+        self._s = self._s0_cent
+        self._rate = 0
+        self._q = self._q0
+
+    def _checkpoint(self):
+        """
+        :returns: state at the beginning of the current month
+        :rtype: tuple
+        """
+        return (self._m, self._s, self._zges, self._ms, self._rate, self._q)
+
+    def _restore(self, checkpoint):
+        """
+        Restores a state.
+
+        :param checkpoint (tuple): state returned by _checkpoint
+        """
+        self._m, self._s, self._zges, self._ms, self._rate, self._q = checkpoint
+
+    def _iter_werte(self, sondertilgungen, checkpoint=None, checkpoints=None, fortschritt=None):
+        """
+        Calculate schedule month by month in cents, see
+        AnnuitaetenKredit._iter_werte. The extra payments are given and the
+        values are returned in Euro.
+        """
+        sondertilgungen = {monat: in_cent(betrag) for monat, betrag in sondertilgungen.items()}
+        if checkpoint is None:
+            self._reset()
+            if self._s == 0:
+                yield (self._m, 0.0, 0.0, 0.0, 0.0)
+        else:
+            self._restore(checkpoint)
+        if self._m == 1:
+            self._ms = _runde(
+                self._s0_cent * self._r.numerator, self._r.denominator, self._rundung)
+
+        # The state is kept in local variables within the loop
+        m, s, zges, ms, rate, q = self._checkpoint()
+        rundung = self._rundung
+        aenderungen = self._cent_aenderungen
+        zaehler, nenner = q.numerator, q.denominator
+        abc = self._zins_abc(q)
+        linear = abc is not None
+        if linear:
+            a, b, c = abc
+        letzte_sondertilgung = max(
+            max(sondertilgungen, default=-1), max(aenderungen, default=-1))
+        try:
+            while s > 0:
+                if (m - 1) % CHECKPOINT_INTERVALL == 0:
+                    if checkpoints is not None:
+                        checkpoints.append((m, s, zges, ms, rate, q))
+                    if fortschritt is not None:
+                        fortschritt(m)
+                if m - 1 in aenderungen:
+                    q, r = aenderungen[m - 1]
+                    zaehler, nenner = q.numerator, q.denominator
+                    abc = self._zins_abc(q)
+                    linear = abc is not None
+                    if linear:
+                        a, b, c = abc
+                    if r is not None:
+                        ms = _runde(s * r.numerator, r.denominator, rundung)
+                stil = sondertilgungen.get(m - 1, 0)
+                if linear:
+                    mzins = (s * a + b) // c
+                else:
+                    mzins = _runde(s * zaehler, nenner, rundung)
+                mtil = ms - mzins + stil
+                if mtil > s:
+                    mtil = s
+                s -= mtil
+                zges += mzins
+                if m == 1:
+                    rate = mzins + mtil - stil
+                # The redemption of the next month, see AnnuitaetenKredit._iter_werte
+                if s > 0 and m > letzte_sondertilgung:
+                    if linear:
+                        naechster_zins = (s * a + b) // c
+                    else:
+                        naechster_zins = _runde(s * zaehler, nenner, rundung)
+                    if ms - naechster_zins <= 0:
+                        raise ValueError("Loan is never paid off")
+                self._zges = zges
+                self._rate = rate
+                yield (m, mzins / 100, (mtil - stil) / 100, stil / 100, s / 100)
+                m += 1
+        finally:
+            self._m, self._s, self._zges, self._ms, self._rate, self._q = m, s, zges, ms, rate, q
+
+    def berechne_segmentiert(self, sondertilgungen={}):
+        """
+        The rounding breaks the closed form of the segments, so the schedule
+        is calculated month by month in cents like by berechne_kreditverlauf.
+        Term, monthly rate and sum of interest are exact.
+
+        :param sondertilgungen (dict of (int,float)): Extra payments.
+               key: month, value: amount.
+        :return: schedule
+        :rtype: Kreditverlauf
+        :raises ValueError: if the loan is never paid off.
+        """
+        return self.berechne_kreditverlauf(sondertilgungen)
+
+    @property
+    def GesamtKosten(self):
+        """
+        Sum of interest payments in Euro.
+        """
+        return self._zges / 100
+
+    @property
+    def GesamtKostenCent(self):
+        """
+        Sum of interest payments in cents.
+        """
+        return self._zges
+
+    @property
+    def Monatsrate(self):
+        """
+        Monthly rate in Euro.
+        """
+        return self._rate / 100
@@ -19,3 +19,10 @@ _CONSOLE_HANDLER.setLevel(logging.ERROR)
 _FORMATTER = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 _CONSOLE_HANDLER.setFormatter(_FORMATTER)
 LOGGER.addHandler(_CONSOLE_HANDLER)
+
+# Statistics of the profiling module
+PROFILE_LOGGER = logging.getLogger('profile')
+PROFILE_LOGGER.setLevel(logging.INFO)
+_PROFILE_HANDLER = logging.StreamHandler()
+_PROFILE_HANDLER.setFormatter(_FORMATTER)
+PROFILE_LOGGER.addHandler(_PROFILE_HANDLER)
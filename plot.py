@@ -18,19 +18,59 @@ from PyQt5.QtWidgets import (
 )
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
-import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+import numpy as np
+
+import profiling
+
+
+MAX_PUNKTE = 2000 # longer series are downsampled before drawing
+
+
+def _ausduennen(monate, *spalten, max_punkte=MAX_PUNKTE):
+    """
+    Downsamples series to at most max_punkte points. First and last point are
+    kept.
+
+    :param monate (ndarray): x values
+    :param spalten (ndarray): y values
+    :returns: (monate, *spalten)
+    """
+    if len(monate) <= max_punkte:
+        return (monate,) + spalten
+    indices = np.unique(np.linspace(0, len(monate) - 1, max_punkte).astype(np.intp))
+    return (monate[indices],) + tuple(spalte[indices] for spalte in spalten)
+
+
+def _stapel_polygon(x, unten, oben):
+    """
+    :returns: vertices of the area between unten and oben
+    :rtype: ndarray of shape (2 * len(x), 2)
+    """
+    return np.concatenate((
+        np.column_stack((x, oben)),
+        np.column_stack((x[::-1], unten[::-1]))))
 
 
 class PlotWindow(QDialog):
+    """
+    Chart of a credit schedule. Figure, axes and artists are created once and
+    updated in place, so the window can be reused for further schedules.
+    """
     def __init__(self, parent=None):
         super(PlotWindow, self).__init__(parent)
 
-        # a figure instance to plot on
-        self.figure = plt.figure()
+        # a figure instance to plot on. It is not managed by pyplot, so it
+        # goes away with the window.
+        self.figure = Figure()
 
         # this is the Canvas Widget that displays the `figure`
         # it takes the `figure` instance as a parameter to __init__
         self.canvas = FigureCanvas(self.figure)
+        if profiling.ENABLED:
+            # The chart is rendered by the event loop after plot
+            self.canvas.draw = profiling.timed('plot.draw')(self.canvas.draw)
 
         # this is the Navigation widget
         # it takes the Canvas widget and a parent
@@ -46,32 +86,122 @@ class PlotWindow(QDialog):
         layout.addWidget(close_button)
         self.setLayout(layout)
 
-    def plot(self, kredit_verlauf):
+        self._rest_axes = self.figure.add_subplot(211)
+        self._rest_axes.set_ylabel('Balance')
+        self._anteil_axes = self.figure.add_subplot(212)
+        self._anteil_axes.set_ylabel('Interest and Payment')
+        self._anteil_axes.set_xlabel('Months')
+
+        # balances of further scenarios, behind the main schedule
+        self._szenario_linien = []
+        self._rest_linie, = self._rest_axes.plot(
+            [], [], linestyle='-', color='cornflowerblue', linewidth=1, zorder=3)
+        self._zins_flaeche = PolyCollection([], facecolors='C0')
+        self._tilgung_flaeche = PolyCollection([], facecolors='C1')
+        self._anteil_axes.add_collection(self._zins_flaeche)
+        self._anteil_axes.add_collection(self._tilgung_flaeche)
+
+    @profiling.timed('plot.update')
+    def plot(self, kredit_verlauf, szenarien=()):
         '''
         Draw schedule.
+
+        :param kredit_verlauf (Kreditverlauf): the schedule
+        :param szenarien (sequence of Kreditverlauf): further schedules, whose
+               balances are drawn for comparison
         '''
-        # instead of ax.hold(False)
-        self.figure.clear()
+        # numpy wraps the columns without copying them
+        monate, zinsen, tilgung, rest = _ausduennen(
+            np.asarray(kredit_verlauf.spalte('Monat')),
+            np.asarray(kredit_verlauf.spalte('Zinsanteil')),
+            # tilgung = [(x.Tilgungsanteil + x.Sondertilgungsanteil)
+            #            for x in kredit_verlauf]
+            np.asarray(kredit_verlauf.spalte('Tilgungsanteil')),
+            np.asarray(kredit_verlauf.spalte('Restschuld')))
+        max_monat = monate[-1] if len(monate) else 1
+
+        self._rest_linie.set_data(monate, rest)
+        while len(self._szenario_linien) < len(szenarien):
+            linie, = self._rest_axes.plot(
+                [], [], linestyle='-', color='lightgray', linewidth=0.5, zorder=2)
+            self._szenario_linien.append(linie)
+        for linie, szenario in zip(self._szenario_linien, szenarien):
+            szenario_monate, szenario_rest = _ausduennen(
+                np.asarray(szenario.spalte('Monat')),
+                np.asarray(szenario.spalte('Restschuld')),
+                max_punkte=MAX_PUNKTE // 4)
+            linie.set_data(szenario_monate, szenario_rest)
+            linie.set_visible(True)
+            if len(szenario_monate):
+                max_monat = max(max_monat, szenario_monate[-1])
+        for linie in self._szenario_linien[len(szenarien):]:
+            linie.set_data([], [])
+            linie.set_visible(False)
+        self._rest_axes.relim(visible_only=True)
+        self._rest_axes.autoscale_view()
+
+        summe = zinsen + tilgung
+        self._zins_flaeche.set_verts([_stapel_polygon(monate, np.zeros_like(zinsen), zinsen)])
+        self._tilgung_flaeche.set_verts([_stapel_polygon(monate, zinsen, summe)])
+        self._anteil_axes.set_xlim(1, max_monat)
+        self._anteil_axes.set_ylim(0, summe.max() * 1.05 if len(summe) and summe.max() > 0 else 1)
+        self._rest_axes.set_xlim(1, max_monat)
 
-        monate = [x.Monat for x in kredit_verlauf]
-        zinsen = [x.Zinsanteil for x in kredit_verlauf]
-        # tilgung = [(x.Tilgungsanteil + x.Sondertilgungsanteil)
-        #            for x in kredit_verlauf]
-        tilgung = [x.Tilgungsanteil for x in kredit_verlauf]
-        rest = [x.Restschuld for x in kredit_verlauf]
+        # refresh canvas
+        self.canvas.draw_idle()
 
-        # plot data
-        color = 'cornflowerblue'
-        plt.subplot(211)
-        plt.ylabel('Balance')
-        plt.plot(monate, rest, linestyle='-', color=color, linewidth=1)
 
-        plt.subplot(212)
-        plt.ylabel('Interest and Payment')
-        plt.xlabel('Months')
-        plt.stackplot(monate, zinsen, tilgung)
+class SensitivityWindow(QDialog):
+    """
+    Heatmap of the sum of interest with contour lines of the term for a grid
+    of interests and redemption rates.
+    """
+    def __init__(self, parent=None):
+        super(SensitivityWindow, self).__init__(parent)
+
+        # the figure is not managed by pyplot and goes away with the window
+        self.figure = Figure()
+        self.canvas = FigureCanvas(self.figure)
+        self.toolbar = NavigationToolbar(self.canvas, self)
+
+        close_button = QPushButton('Close')
+        close_button.clicked.connect(self.close)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+        layout.addWidget(close_button)
+        self.setLayout(layout)
+
+    def plot(self, raster):
+        '''
+        Draw grid.
+
+        :param raster (portfolio.Raster): key figures of the grid
+        '''
+        self.figure.clear()
+        axes = self.figure.add_subplot(111)
+
+        tilgungen = raster.tilgungen
+        zinsen = raster.zinsen
+        image = axes.imshow(
+            raster.GesamtKosten,
+            origin='lower',
+            aspect='auto',
+            interpolation='nearest',
+            extent=(tilgungen[0], tilgungen[-1], zinsen[0], zinsen[-1]))
+        self.figure.colorbar(image, ax=axes, label='Total Interest')
+
+        jahre = np.where(raster.abbezahlt, raster.Laufzeit / 12.0, np.nan)
+        if np.isfinite(jahre).any():
+            contours = axes.contour(
+                tilgungen, zinsen, jahre,
+                levels=[5, 10, 15, 20, 25, 30, 40, 50],
+                colors='white', linewidths=0.8)
+            axes.clabel(contours, fmt='%d Years')
+        axes.set_xlabel('Down Payment [%]')
+        axes.set_ylabel('Nominal Interest [%]')
 
-        # refresh canvas
         self.canvas.draw()
 
 if __name__ == '__main__':
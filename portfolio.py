@@ -0,0 +1,474 @@
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Calculate the schedules of a whole portfolio of annuity loans at once.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import numpy as np
+
+from kredit import RESTSCHULD_TOLERANZ, Kreditverlauf, _zinsaenderungen
+
+MAX_MONATE = 1200 # stop after 100 years, loans may never be paid off
+MONATSBLOCK = 120 # months, by which the buffers of the schedules grow
+
+
+class PortfolioKennzahlen(object):
+    """
+    Key figures of all loans of a portfolio.
+    """
+    def __init__(self, monatsrate, laufzeit, gesamtkosten, abbezahlt):
+        """
+        C'tor.
+
+        :param monatsrate (ndarray of float): monthly rates
+        :param laufzeit (ndarray of int): terms in months, 0 if never paid off
+        :param gesamtkosten (ndarray of float): sums of interest, NaN if never
+               paid off
+        :param abbezahlt (ndarray of bool): False for loans, which are never
+               paid off
+        """
+        self.Monatsrate = monatsrate
+        self.Laufzeit = laufzeit
+        self.GesamtKosten = gesamtkosten
+        self.abbezahlt = abbezahlt
+
+
+class Raster(PortfolioKennzahlen):
+    """
+    Key figures for a grid of interests and redemption rates. The arrays have
+    the shape (number of interests, number of redemption rates).
+    """
+    def __init__(self, zinsen, tilgungen, kennzahlen):
+        """
+        C'tor.
+
+        :param zinsen (ndarray of float): nominal interests in %
+        :param tilgungen (ndarray of float): redemption rates in %
+        :param kennzahlen (PortfolioKennzahlen): key figures of the flattened grid
+        """
+        form = (len(zinsen), len(tilgungen))
+        super(Raster, self).__init__(
+            kennzahlen.Monatsrate.reshape(form),
+            kennzahlen.Laufzeit.reshape(form),
+            kennzahlen.GesamtKosten.reshape(form),
+            kennzahlen.abbezahlt.reshape(form))
+        self.zinsen = zinsen
+        self.tilgungen = tilgungen
+
+
+def _restschuld(restschuld, rate, q, monate):
+    """
+    Balances of annuities after some months without extra payments,
+    see kredit._restschuld.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        faktor = np.where(
+            q == 0.0, monate, np.expm1(monate * np.log1p(q)) / np.where(q == 0.0, 1.0, q))
+    return restschuld - (rate - restschuld * q) * faktor
+
+
+def _tilgungsmonate(restschuld, rate, q):
+    """
+    Numbers of months annuities without extra payments need to pay off the
+    balances, see kredit._tilgungsmonate.
+
+    :returns: numbers of months, 0 if the balance is never paid off.
+    :rtype: ndarray of int
+    """
+    moeglich = rate - restschuld * q > 1e-12 * rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        monate = np.where(
+            q == 0.0,
+            np.ceil(restschuld / rate),
+            np.ceil(np.log1p(restschuld * q / (rate - restschuld * q))
+                    / np.log1p(np.where(q == 0.0, 1.0, q))))
+    monate = np.where(moeglich, np.maximum(np.nan_to_num(monate), 1), 0).astype(np.intp)
+    # Correct rounding errors of the logarithms
+    zu_spaet = moeglich & (monate > 1) & (_restschuld(restschuld, rate, q, monate - 1) <= 0)
+    monate[zu_spaet] -= 1
+    zu_frueh = moeglich & (_restschuld(restschuld, rate, q, monate) > 0)
+    monate[zu_frueh] += 1
+    return monate
+
+
+def _zinsaenderungen_nach_monat(zinsaenderungen, anzahl):
+    """
+    Regroups interest changes by month.
+
+    :param zinsaenderungen: interest changes for all loans (dict) or one dict
+           per loan (sequence of dict), see AnnuitaetenKredit. May be None.
+    :param anzahl (int): number of loans
+    :return: key: month, value: (indices of the loans, nominal interests in
+             %, redemption rates in % or NaN to keep the monthly rate)
+    :rtype: dict of (int, (ndarray, ndarray, ndarray))
+    """
+    if zinsaenderungen is None:
+        return {}
+    if isinstance(zinsaenderungen, dict):
+        zinsaenderungen = [zinsaenderungen] * anzahl
+    elif len(zinsaenderungen) != anzahl:
+        raise ValueError("One dict of interest changes per loan expected")
+    nach_monat = {}
+    for i, aenderungen in enumerate(zinsaenderungen):
+        for monat, (zins, tilgung) in _zinsaenderungen(aenderungen).items():
+            nach_monat.setdefault(monat, ([], [], []))
+            nach_monat[monat][0].append(i)
+            nach_monat[monat][1].append(zins)
+            nach_monat[monat][2].append(np.nan if tilgung is None else tilgung)
+    return {
+        monat: (np.array(indices, dtype=np.intp),
+                np.array(zinsen, dtype=float),
+                np.array(tilgungen, dtype=float))
+        for monat, (indices, zinsen, tilgungen) in nach_monat.items()}
+
+
+def _sondertilgungen_nach_monat(sondertilgungen, anzahl):
+    """
+    Regroups the extra payments by month.
+
+    :param sondertilgungen (sequence of dict of (int,float)): extra payments
+           per loan. key: month, value: amount. May be None.
+    :param anzahl (int): number of loans
+    :return: key: month, value: (indices of the loans, amounts)
+    :rtype: dict of (int, (ndarray, ndarray))
+    """
+    nach_monat = {}
+    if sondertilgungen is None:
+        return nach_monat
+    if len(sondertilgungen) != anzahl:
+        raise ValueError("One dict of extra payments per loan expected")
+    for i, payments in enumerate(sondertilgungen):
+        for monat, betrag in (payments or {}).items():
+            nach_monat.setdefault(monat, ([], []))
+            nach_monat[monat][0].append(i)
+            nach_monat[monat][1].append(betrag)
+    return {
+        monat: (np.array(indices, dtype=np.intp), np.array(betraege, dtype=float))
+        for monat, (indices, betraege) in nach_monat.items()}
+
+
+def _startwerte(tilgungen, zinsen, aenderung):
+    """
+    Applies the interest changes of month 0 like kredit._startwerte.
+
+    :param tilgungen (ndarray): redemption rates in %
+    :param zinsen (ndarray): nominal interests in %
+    :param aenderung (tuple): changes of month 0, see
+           _zinsaenderungen_nach_monat, or None
+    :returns: redemption rates and nominal interests of the first month in %
+    :rtype: tuple of ndarray
+    """
+    if aenderung is None:
+        return tilgungen, zinsen
+    indices, neue_zinsen, neue_tilgungen = aenderung
+    tilgungen, zinsen = tilgungen.copy(), zinsen.copy()
+    tilgungen[indices] = np.where(
+        np.isnan(neue_tilgungen), tilgungen[indices] + zinsen[indices] - neue_zinsen,
+        neue_tilgungen)
+    zinsen[indices] = neue_zinsen
+    return tilgungen, zinsen
+
+
+def berechne_kennzahlen(betraege, tilgungen, zinsen, sondertilgungen=None, zinsaenderungen=None):
+    """
+    Calculates monthly rate, term and sum of interest of many loans
+    analytically, see AnnuitaetenKredit.berechne_segmentiert. The effort
+    depends on the number of months with extra payments or interest changes,
+    not on the terms.
+
+    :param betraege (array of float): loan amounts
+    :param tilgungen (array of float): redemption rates in %
+    :param zinsen (array of float): nominal interests in %
+    :param sondertilgungen: extra payments for all loans (dict of (int,float))
+           or one dict per loan (sequence of dict of (int,float)). May be None.
+    :param zinsaenderungen: interest changes for all loans (dict) or one dict
+           per loan (sequence of dict), see AnnuitaetenKredit. May be None.
+    :rtype: PortfolioKennzahlen
+    """
+    s0, tilgungen, zinsen = np.broadcast_arrays(
+        np.asarray(betraege, dtype=float),
+        np.asarray(tilgungen, dtype=float),
+        np.asarray(zinsen, dtype=float))
+    s0 = s0.ravel()
+    anzahl = len(s0)
+    if isinstance(sondertilgungen, dict):
+        # The same amounts for all loans
+        soti_nach_monat = dict(sondertilgungen)
+    else:
+        soti_nach_monat = _sondertilgungen_nach_monat(sondertilgungen, anzahl)
+
+    aenderungen = _zinsaenderungen_nach_monat(zinsaenderungen, anzahl)
+    tilgungen, zinsen = _startwerte(tilgungen.ravel(), zinsen.ravel(), aenderungen.pop(0, None))
+    t0 = tilgungen / 100.0
+    z = zinsen / 100.0
+
+    # Months with extra payments or interest changes of any loan are the
+    # borders of the segments
+    wechsel = sorted(set(
+        monat + 1 for monat in soti_nach_monat if monat >= 0) | set(monat + 1 for monat in aenderungen))
+    starts = [1] + [monat for monat in wechsel if monat > 1]
+
+    q = z / 12
+    rate = (s0 * t0 + s0 * z) / 12
+    s = s0.copy()
+    zges = np.zeros(anzahl)
+    laufzeit = np.where(s0 == 0.0, 1, 0).astype(np.intp)
+    offen = s0 > 0
+    monatsrate = np.zeros(anzahl)
+    for nummer, monat in enumerate(starts):
+        ende = starts[nummer + 1] if nummer + 1 < len(starts) else None
+        soti = soti_nach_monat.get(monat - 1, 0.0)
+        if isinstance(soti, tuple):
+            indices, betraege = soti
+            soti = np.zeros(anzahl)
+            soti[indices] = betraege
+        if monat - 1 in aenderungen:
+            indices, neue_zinsen, neue_tilgungen = aenderungen[monat - 1]
+            neue_zinsen = neue_zinsen / 100.0
+            q[indices] = neue_zinsen / 12
+            neu = ~np.isnan(neue_tilgungen)
+            indices = indices[neu]
+            rate[indices] = s[indices] * (neue_tilgungen[neu] / 100.0 + neue_zinsen[neu]) / 12
+        if monat == 1:
+            tilgung = np.minimum(rate - s0 * q + soti, s0)
+            monatsrate = np.where(offen, s0 * q + tilgung - soti, 0.0)
+
+        # First month of the segment contains the extra payment.
+        nach_erstem = s * (1 + q) - rate - soti
+        fertig = offen & (nach_erstem <= 0)
+        zges[fertig] += s[fertig] * q[fertig]
+        laufzeit[fertig] = monat
+        offen &= ~fertig
+
+        if ende == monat + 1:
+            # A segment of one month, e.g. of monthly extra payments, ends
+            # after its first month
+            zges[offen] += (rate + soti - (s - nach_erstem))[offen]
+            s = np.where(offen, nach_erstem, s)
+        else:
+            monate = _tilgungsmonate(nach_erstem, rate, q)
+            if ende is None:
+                nie = offen & (monate == 0)
+                laufzeit[nie] = 0
+                zges[nie] = np.nan
+                offen &= ~nie
+            fertig = offen & (monate > 0)
+            if ende is not None:
+                fertig &= monat + monate < ende
+            vor_letztem = _restschuld(nach_erstem, rate, q, np.maximum(monate - 1, 0))
+            zges[fertig] += (rate * monate + soti - (s - vor_letztem) + vor_letztem * q)[fertig]
+            laufzeit[fertig] = (monat + monate)[fertig]
+            offen &= ~fertig
+
+            if ende is not None:
+                segment_ende = _restschuld(nach_erstem, rate, q, ende - monat - 1)
+                zges[offen] += (rate * (ende - monat) + soti - (s - segment_ende))[offen]
+                s = np.where(offen, segment_ende, s)
+        if not offen.any():
+            break
+    return PortfolioKennzahlen(monatsrate, laufzeit, zges, laufzeit > 0)
+
+
+def berechne_raster(betrag, zinsen, tilgungen, sondertilgungen={}):
+    """
+    Calculates monthly rate, term and sum of interest for all combinations of
+    interests and redemption rates at once.
+
+    :param betrag (float): loan amount
+    :param zinsen (array of float): nominal interests in %
+    :param tilgungen (array of float): redemption rates in %
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :rtype: Raster
+    """
+    zinsen = np.asarray(zinsen, dtype=float)
+    tilgungen = np.asarray(tilgungen, dtype=float)
+    z, t = np.meshgrid(zinsen, tilgungen, indexing='ij')
+    return Raster(zinsen, tilgungen, berechne_kennzahlen(betrag, t, z, sondertilgungen))
+
+
+class PortfolioVerlauf(object):
+    """
+    Schedules of all loans of a portfolio, laid out in columns.
+
+    Every column is an array of shape (number of loans, number of months).
+    Row i holds the schedule of loan i, entries after the loan was paid off
+    are zero.
+    """
+    def __init__(self, monat, zins, tilgung, soti, restschuld, laufzeit, abbezahlt):
+        """
+        C'tor.
+
+        :param monat (ndarray of int): number of month, 0 after payoff
+        :param zins (ndarray of float): interest parts of the monthly rates
+        :param tilgung (ndarray of float): redemption parts of the monthly rates
+        :param soti (ndarray of float): extra payments
+        :param restschuld (ndarray of float): balances after the monthly rates
+        :param laufzeit (ndarray of int): number of months of each schedule
+        :param abbezahlt (ndarray of bool): False for loans, which were not paid
+               off within the maximum number of months
+        """
+        self.Monat = monat
+        self.Zinsanteil = zins
+        self.Tilgungsanteil = tilgung
+        self.Sondertilgungsanteil = soti
+        self.Restschuld = restschuld
+        self.Laufzeit = laufzeit
+        self.abbezahlt = abbezahlt
+
+    def __len__(self):
+        return len(self.Laufzeit)
+
+    def kreditverlauf(self, i):
+        """
+        Schedule of a single loan in the format of AnnuitaetenKredit.
+
+        :param i (int): index of the loan
+        :rtype: Kreditverlauf
+        """
+        laufzeit = self.Laufzeit[i]
+        return Kreditverlauf.aus_puffern(
+            np.ascontiguousarray(self.Monat[i, :laufzeit], dtype=np.intc),
+            np.ascontiguousarray(self.Zinsanteil[i, :laufzeit]),
+            np.ascontiguousarray(self.Tilgungsanteil[i, :laufzeit]),
+            np.ascontiguousarray(self.Sondertilgungsanteil[i, :laufzeit]),
+            np.ascontiguousarray(self.Restschuld[i, :laufzeit]))
+
+
+class AnnuitaetenPortfolio(object):
+    """
+    Calculator for a portfolio of annuity loans. All loans are stepped forward
+    month by month together, the results equal those of AnnuitaetenKredit.
+    """
+
+    def __init__(self, betraege, tilgungen, zinsen, zinsaenderungen=None):
+        """
+        Initializes the portfolio calculator.
+
+        :param betraege (sequence of float): loan amounts
+        :param tilgungen (sequence of float): redemption rates in %
+        :param zinsen (sequence of float): nominal interests in %
+        :param zinsaenderungen: interest changes for all loans (dict) or one
+               dict per loan (sequence of dict), see AnnuitaetenKredit. May be
+               None.
+        """
+        self._s0 = np.array(betraege, dtype=float)
+        tilgungen = np.array(tilgungen, dtype=float)
+        zinsen = np.array(zinsen, dtype=float)
+        if not self._s0.shape == tilgungen.shape == zinsen.shape or self._s0.ndim != 1:
+            raise ValueError("Loan amounts, redemption rates and interests "
+                             "must be one-dimensional and of equal length")
+        self._zinsaenderungen = _zinsaenderungen_nach_monat(zinsaenderungen, len(self._s0))
+        tilgungen, zinsen = _startwerte(tilgungen, zinsen, self._zinsaenderungen.pop(0, None))
+        self._t0 = tilgungen / 100.0
+        self._z = zinsen / 100.0
+
+        self._zges = np.zeros_like(self._s0) # sums of interest
+        self._verlauf = None # PortfolioVerlauf
+
+    def berechne_kreditverlaeufe(self, sondertilgungen=None, max_monate=MAX_MONATE):
+        """
+        Calculate the schedules of all loans.
+
+        :param sondertilgungen (sequence of dict of (int,float)): Extra payments
+               per loan, same format as for AnnuitaetenKredit. May be None.
+        :param max_monate (int): maximum length of a schedule
+        :return: schedules of all loans
+        :rtype: PortfolioVerlauf
+        """
+        anzahl = len(self._s0)
+        soti_nach_monat = _sondertilgungen_nach_monat(sondertilgungen, anzahl)
+
+        ms = (self._s0 * self._t0 + self._s0 * self._z) / 12
+        z = self._z.copy() # current nominal interests
+        s = self._s0.copy()
+        zges = np.zeros(anzahl)
+        laufzeit = np.zeros(anzahl, dtype=np.intp)
+        # A loan without balance gets a single row of zeros.
+        laufzeit[self._s0 == 0.0] = 1
+
+        # Only the loans, which are not paid off yet, are stepped forward.
+        aktiv = np.flatnonzero(s > 0)
+        stil_alle = np.zeros(anzahl)
+        # The columns are stored month-major, so every month writes into
+        # contiguous rows. The buffers are sized by the terms without extra
+        # payments, which usually suffices, and grow in blocks otherwise.
+        monate = _tilgungsmonate(self._s0[aktiv], ms[aktiv], self._z[aktiv] / 12)
+        kapazitaet = min(max_monate, int(monate.max()) + 1 if len(aktiv) else 1)
+        if len(aktiv) and (monate == 0).any():
+            kapazitaet = max_monate
+        spalten = [np.zeros((kapazitaet, anzahl)) for _ in range(4)]
+        m = 1
+        while len(aktiv) and m <= max_monate:
+            if m - 1 in self._zinsaenderungen:
+                indices, neue_zinsen, neue_tilgungen = self._zinsaenderungen[m - 1]
+                z[indices] = neue_zinsen / 100.0
+                neu = ~np.isnan(neue_tilgungen)
+                indices = indices[neu]
+                ms[indices] = s[indices] * (neue_tilgungen[neu] / 100.0 + z[indices]) / 12
+            s_aktiv = s[aktiv]
+            z_aktiv = z[aktiv]
+            if m - 1 in soti_nach_monat:
+                indices, betraege = soti_nach_monat[m - 1]
+                stil_alle[indices] = betraege
+                stil = stil_alle[aktiv]
+                stil_alle[indices] = 0.0
+            else:
+                stil = np.zeros(len(aktiv))
+
+            if m > len(spalten[0]):
+                spalten = [
+                    np.concatenate((spalte, np.zeros((MONATSBLOCK, anzahl))))
+                    for spalte in spalten]
+            mzins = s_aktiv * z_aktiv / 12
+            if m == 1:
+                mtil = (s_aktiv * self._t0[aktiv]) / 12 + stil
+            else:
+                mtil = ms[aktiv] - mzins + stil
+            mtil = np.where(mtil > s_aktiv, s_aktiv, mtil)
+            s_aktiv = s_aktiv - mtil
+            # Balances of the order of rounding errors are paid off, see
+            # AnnuitaetenKredit._monatsschritt
+            rest = s_aktiv < RESTSCHULD_TOLERANZ * self._s0[aktiv]
+            mtil = np.where(rest, mtil + s_aktiv, mtil)
+            s_aktiv = np.where(rest, 0.0, s_aktiv)
+            s[aktiv] = s_aktiv
+            zges[aktiv] += mzins
+
+            for spalte, werte in zip(spalten, (mzins, mtil - stil, stil, s_aktiv)):
+                spalte[m - 1, aktiv] = werte
+
+            laufzeit[aktiv] = m
+            aktiv = aktiv[s_aktiv > 0]
+            m += 1
+
+        anzahl_monate = max(m - 1, int(laufzeit.max()) if anzahl else 0)
+        # Views of shape (number of loans, number of months) without copy
+        zins, tilgung, soti, rest = (spalte[:anzahl_monate].T for spalte in spalten)
+        monate = np.arange(1, anzahl_monate + 1, dtype=np.intc)
+        monat = np.where(monate[:, np.newaxis] <= laufzeit[np.newaxis, :], monate[:, np.newaxis], 0).T
+
+        self._zges = zges
+        self._verlauf = PortfolioVerlauf(
+            monat, zins, tilgung, soti, rest, laufzeit, s <= 0)
+        return self._verlauf
+
+    @property
+    def GesamtKosten(self):
+        """
+        Sums of interest payments.
+        """
+        return self._zges
+
+    @property
+    def Monatsrate(self):
+        """
+        Monthly rates.
+        """
+        if self._verlauf.Zinsanteil.shape[1] == 0:
+            return np.zeros(len(self._s0))
+        return self._verlauf.Zinsanteil[:, 0] + self._verlauf.Tilgungsanteil[:, 0]
@@ -0,0 +1,214 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Named timers and counters for the main stages of the application.
+
+Enabled by the environment variable CREDIT_PROFILE:
+
+    CREDIT_PROFILE=1              statistics are logged at exit
+    CREDIT_PROFILE=profile.json   statistics are written to this file at exit
+
+Disabled, timed returns the function unchanged and timer returns a shared
+context manager, which does nothing.
+
+Worker processes do not run the exit handlers, so their statistics are passed
+to the parent by take and merge, see runner.run_portfolio.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import atexit
+import collections
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+import log
+
+_SETTING = os.environ.get('CREDIT_PROFILE', '')
+ENABLED = _SETTING not in ('', '0')
+
+_lock = threading.Lock()
+_durations = collections.defaultdict(list) # name: durations in s
+_counters = collections.Counter() # name: count
+
+
+class _NullTimer(object):
+    """
+    Timer used, while profiling is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    """
+    Adds the duration of a with block to the statistics.
+    """
+    __slots__ = ('_name', '_start')
+
+    def __init__(self, name):
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        add_duration(self._name, time.perf_counter() - self._start)
+        return False
+
+
+def timer(name):
+    """
+    Times a with block:
+
+        with profiling.timer('stage'):
+            ...
+
+    :param name (str): name of the stage
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed(name):
+    """
+    Decorator, which times every call of a function.
+
+    :param name (str): name of the stage
+    """
+    def decorate(function):
+        if not ENABLED:
+            return function
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _Timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_duration(name, seconds):
+    """
+    :param name (str): name of the stage
+    :param seconds (float): duration of one run of the stage
+    """
+    with _lock:
+        _durations[name].append(seconds)
+
+
+def count(name, amount=1):
+    """
+    Increments a counter.
+
+    :param name (str): name of the counter
+    :param amount (int): increment
+    """
+    if ENABLED:
+        with _lock:
+            _counters[name] += amount
+
+
+def take():
+    """
+    Removes all timings and counters and returns them, so they can be merged
+    into the statistics of another process.
+
+    :returns: raw durations and counters, None if profiling is disabled
+    :rtype: tuple(dict, dict)
+    """
+    if not ENABLED:
+        return None
+    with _lock:
+        result = (dict(_durations), dict(_counters))
+        _durations.clear()
+        _counters.clear()
+    return result
+
+
+def merge(data):
+    """
+    Adds the timings and counters returned by take.
+
+    :param data (tuple): result of take, may be None
+    """
+    if data is None:
+        return
+    durations, counters = data
+    with _lock:
+        for name, values in durations.items():
+            _durations[name].extend(values)
+        _counters.update(counters)
+
+
+def _percentile(sorted_values, percent):
+    # nearest rank
+    return sorted_values[max(0, math.ceil(percent / 100.0 * len(sorted_values)) - 1)]
+
+
+def statistics():
+    """
+    :returns: key: name of the stage, value: count, total, p50 and p95 in s.
+              Counters have the count only.
+    :rtype: dict of (str, dict)
+    """
+    with _lock:
+        durations = {name: sorted(values) for name, values in _durations.items()}
+        counters = dict(_counters)
+    result = {
+        name: {
+            'count': len(values),
+            'total': sum(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95)}
+        for name, values in durations.items()}
+    for name, value in counters.items():
+        result[name] = {'count': value}
+    return result
+
+
+def reset():
+    """
+    Removes all timings and counters.
+    """
+    with _lock:
+        _durations.clear()
+        _counters.clear()
+
+
+def dump(file_name=None):
+    """
+    Writes the statistics into a JSON file or the log.
+
+    :param file_name (str): path of the JSON file, None for the log
+    """
+    result = statistics()
+    if file_name:
+        with open(file_name, 'w') as file:
+            json.dump(result, file, indent=2, sort_keys=True)
+        return
+    for name, values in sorted(result.items()):
+        if 'total' in values:
+            log.PROFILE_LOGGER.info(
+                "%-32s %8d calls %10.4f s total %10.6f s p50 %10.6f s p95",
+                name, values['count'], values['total'], values['p50'], values['p95'])
+        else:
+            log.PROFILE_LOGGER.info("%-32s %8d", name, values['count'])
+
+if ENABLED:
+    atexit.register(dump, None if _SETTING == '1' else _SETTING)
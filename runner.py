@@ -0,0 +1,198 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Calculates large portfolios of annuity loans in parallel processes.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import concurrent.futures
+import os
+import time
+
+import profiling
+from kredit import AnnuitaetenKredit
+
+MODE_SUMMARY = 'summary'
+MODE_SCHEDULE = 'schedule'
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class LoanSummary(object):
+    """
+    Key figures of a loan.
+    """
+    __slots__ = ('Monatsrate', 'Laufzeit', 'GesamtKosten')
+
+    def __init__(self, monatsrate, laufzeit, gesamtkosten):
+        """
+        C'tor.
+
+        :param monatsrate (float): monthly rate
+        :param laufzeit (int): term in months
+        :param gesamtkosten (float): sum of interest payments
+        """
+        self.Monatsrate = monatsrate
+        self.Laufzeit = laufzeit
+        self.GesamtKosten = gesamtkosten
+
+
+class ChunkReport(object):
+    """
+    Timing and failures of a chunk of loans.
+    """
+    def __init__(self, index, first, count, seconds=0.0, errors=None, profile=None):
+        """
+        C'tor.
+
+        :param index (int): number of the chunk
+        :param first (int): index of the first loan of the chunk in the portfolio
+        :param count (int): number of loans in the chunk
+        :param seconds (float): calculation time
+        :param errors (list of (int, str)): index of the loan in the portfolio
+               and error message of every failed loan
+        :param profile (tuple): profiling statistics of the worker process,
+               see profiling.take
+        """
+        self.index = index
+        self.first = first
+        self.count = count
+        self.seconds = seconds
+        self.errors = errors or []
+        self.profile = profile
+
+
+class PortfolioRun(object):
+    """
+    Results of a portfolio run.
+    """
+    def __init__(self, results, chunks):
+        """
+        C'tor.
+
+        :param results (list): one result per loan in input order, None for
+               failed loans
+        :param chunks (list of ChunkReport objects): reports in input order
+        """
+        self.results = results
+        self.chunks = chunks
+
+    @property
+    def errors(self):
+        """
+        :returns: index and error message of every failed loan
+        :rtype: list of (int, str)
+        """
+        return [error for chunk in self.chunks for error in chunk.errors]
+
+
+def calculate_loan(loan, mode=MODE_SUMMARY):
+    """
+    Calculates a single loan.
+
+    :param loan (tuple): (betrag, tilgung, zins),
+           (betrag, tilgung, zins, sondertilgungen) or
+           (betrag, tilgung, zins, sondertilgungen, zinsaenderungen)
+    :param mode (str): MODE_SUMMARY or MODE_SCHEDULE
+    :returns: the summary or the schedule
+    :rtype: LoanSummary or Kreditverlauf
+    """
+    betrag, tilgung, zins = loan[:3]
+    sondertilgungen = loan[3] if len(loan) > 3 and loan[3] else {}
+    zinsaenderungen = loan[4] if len(loan) > 4 else None
+    kredit = AnnuitaetenKredit(betrag, tilgung, zins, zinsaenderungen)
+    if mode == MODE_SCHEDULE:
+        return kredit.berechne_kreditverlauf(sondertilgungen)
+    verlauf = kredit.berechne_segmentiert(sondertilgungen)
+    return LoanSummary(kredit.Monatsrate, len(verlauf), kredit.GesamtKosten)
+
+
+def _calculate_chunk(index, first, loans, mode):
+    """
+    Calculates a chunk of loans. Runs in a worker process.
+
+    :returns: results and report of the chunk
+    :rtype: tuple(list, ChunkReport)
+    """
+    start = time.perf_counter()
+    results = []
+    errors = []
+    for i, loan in enumerate(loans):
+        try:
+            results.append(calculate_loan(loan, mode))
+        except Exception as ex:
+            results.append(None)
+            errors.append((first + i, str(ex)))
+    report = ChunkReport(
+        index, first, len(loans), time.perf_counter() - start, errors)
+    return results, report
+
+
+def _calculate_chunk_in_worker(index, first, loans, mode):
+    """
+    Calculates a chunk of loans in a worker process. The profiling statistics
+    of the chunk are returned with the report, because worker processes do
+    not write them at exit.
+
+    :returns: results and report of the chunk
+    :rtype: tuple(list, ChunkReport)
+    """
+    # Drop statistics inherited from the parent process or an earlier chunk
+    profiling.take()
+    results, report = _calculate_chunk(index, first, loans, mode)
+    report.profile = profiling.take()
+    return results, report
+
+
+def run_portfolio(loans, mode=MODE_SUMMARY, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Calculates all loans of a portfolio. The portfolio is split into chunks,
+    which are calculated in a pool of worker processes.
+
+    :param loans (sequence of tuple): (betrag, tilgung, zins),
+           (betrag, tilgung, zins, sondertilgungen) or
+           (betrag, tilgung, zins, sondertilgungen, zinsaenderungen) per loan
+    :param mode (str): MODE_SUMMARY or MODE_SCHEDULE
+    :param chunk_size (int): number of loans per chunk
+    :param workers (int): number of processes, default: number of CPUs.
+           With 1 worker everything is calculated in this process.
+    :rtype: PortfolioRun
+    """
+    if mode not in (MODE_SUMMARY, MODE_SCHEDULE):
+        raise ValueError("Unknown mode {}".format(mode))
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be positive")
+    loans = list(loans)
+    workers = workers or os.cpu_count() or 1
+    chunks = [
+        (index, first, loans[first:first + chunk_size])
+        for index, first in enumerate(range(0, len(loans), chunk_size))]
+
+    results = [None] * len(loans)
+    reports = [None] * len(chunks)
+    if workers == 1 or len(chunks) <= 1:
+        for index, first, chunk in chunks:
+            chunk_results, reports[index] = _calculate_chunk(index, first, chunk, mode)
+            results[first:first + len(chunk)] = chunk_results
+        return PortfolioRun(results, reports)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_calculate_chunk_in_worker, index, first, chunk, mode):
+                (index, first, chunk)
+            for index, first, chunk in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            index, first, chunk = futures[future]
+            try:
+                chunk_results, reports[index] = future.result()
+                results[first:first + len(chunk)] = chunk_results
+                profiling.merge(reports[index].profile)
+            except Exception as ex:
+                # The whole chunk got lost, e.g. because the worker died
+                reports[index] = ChunkReport(
+                    index, first, len(chunk),
+                    errors=[(first + i, str(ex)) for i in range(len(chunk))])
+    return PortfolioRun(results, reports)
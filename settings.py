@@ -0,0 +1,331 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Credit settings and project files.
+
+Project files are written as JSON:
+
+    {"format": "credit-project", "version": 1,
+     "kreditsumme": 300000.0, "zins": 3.5, "tilgung": 2.0,
+     "start_date": "01/2018", "extra_payments": [["01/2020", 5000.0]]}
+
+Older YAML project files, which contain a pickled CreditSettings object, are
+still read, by a safe loader, which knows the settings and nothing else.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import csv
+import json
+import math
+import os
+
+import profiling
+import util
+
+PROJECT_FORMAT = 'credit-project'
+PROJECT_VERSION = 1 # latest version of the project format
+PROJECT_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# Tag of the settings in older project files. The class used to live in dialog.py.
+_SETTINGS_TAG = 'tag:yaml.org,2002:python/object:dialog.CreditSettings'
+_TUPLE_TAG = 'tag:yaml.org,2002:python/tuple'
+
+class CreditSettings(object):
+    """
+    Stores the credit settings.
+    """
+    def __init__(self,
+            kreditsumme=0.0,
+            zins=0.0,
+            tilgung=0.0,
+            start_date="01/2000",
+            extra_payments=[]):
+        """
+        C'tor.
+        """
+        self.kreditsumme = kreditsumme
+        self.zins = zins
+        self.tilgung = tilgung
+        self.start_date = start_date
+        self.extra_payments = extra_payments
+
+    def sondertilgungen(self):
+        """
+        Converts the extra payments into months relative to the start date.
+        Payments before the start date get negative months, which are not
+        paid.
+
+        :returns: key: month, value: amount
+        :rtype: dict of (int, float)
+        """
+        offsets = util.month_offsets(
+            [payment[0] for payment in self.extra_payments], self.start_date)
+        return {
+            month: payment[1] for month, payment in zip(offsets, self.extra_payments)}
+
+
+class ProjectFileError(Exception):
+    """
+    Raised, if a project file cannot be read or written.
+    """
+
+# YAML is imported and the loader is set up on first use only.
+_LOADER = None
+
+def _construct_settings(loader, node):
+    # Without defaults, so missing keys are detected by _validate
+    settings = CreditSettings.__new__(CreditSettings)
+    yield settings
+    settings.__dict__.update(loader.construct_mapping(node, deep=True))
+
+def _construct_tuple(loader, node):
+    return tuple(loader.construct_sequence(node, deep=True))
+
+def _yaml():
+    """
+    Imports YAML and creates a safe loader, which knows the credit settings
+    and nothing else. The loader is based on libyaml, if available.
+
+    :returns: (yaml module, loader class)
+    """
+    global _LOADER
+    import yaml
+    if _LOADER is None:
+        safe_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        loader = type('SettingsLoader', (safe_loader,), {})
+        loader.add_constructor(_SETTINGS_TAG, _construct_settings)
+        loader.add_constructor(
+            'tag:yaml.org,2002:python/object:settings.CreditSettings', _construct_settings)
+        loader.add_constructor(_TUPLE_TAG, _construct_tuple)
+        _LOADER = loader
+    return yaml, _LOADER
+
+
+def _check(condition, file_name, message):
+    if not condition:
+        raise ProjectFileError("{}: {}".format(file_name, message))
+
+
+def _is_number(value):
+    """
+    :returns: True for finite ints and floats, bools are no numbers
+    :rtype: bool
+    """
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        return False
+    try:
+        return math.isfinite(value)
+    except OverflowError:
+        # int beyond the range of float
+        return False
+
+
+def _settings_from_dict(data, file_name):
+    """
+    Validates a project of the JSON format.
+
+    :param data (dict): the parsed file
+    :param file_name (str): path of the file for error messages
+    :rtype: CreditSettings
+    :raises ProjectFileError: if the project does not match the format
+    """
+    _check(isinstance(data, dict) and data.get('format') == PROJECT_FORMAT,
+           file_name, "not a credit project file")
+    version = data.get('version')
+    _check(isinstance(version, int) and 1 <= version <= PROJECT_VERSION,
+           file_name, "unsupported version {}".format(version))
+    settings = CreditSettings(
+        data.get('kreditsumme'),
+        data.get('zins'),
+        data.get('tilgung'),
+        data.get('start_date'),
+        data.get('extra_payments', []))
+    return _validate(settings, file_name)
+
+
+def _validate(settings, file_name):
+    """
+    Checks the settings of a project file of either format and converts the
+    numbers to float.
+
+    :param settings (CreditSettings): the loaded settings, attributes may be
+           missing
+    :param file_name (str): path of the file for error messages
+    :returns: settings
+    :rtype: CreditSettings
+    :raises ProjectFileError: if numbers, dates or extra payments are missing
+            or invalid
+    """
+    for key in ('kreditsumme', 'zins', 'tilgung'):
+        _check(_is_number(getattr(settings, key, None)),
+               file_name, "{} must be a finite number".format(key))
+    start_date = getattr(settings, 'start_date', None)
+    try:
+        util.parse_month(start_date)
+    except (AttributeError, TypeError, ValueError):
+        _check(False, file_name, "invalid start_date {!r}".format(start_date))
+    extra_payments = getattr(settings, 'extra_payments', None)
+    _check(isinstance(extra_payments, (list, tuple)),
+           file_name, "extra_payments must be a list")
+    for payment in extra_payments:
+        try:
+            month, amount = payment
+            util.parse_month(month)
+        except (AttributeError, TypeError, ValueError):
+            _check(False, file_name, "invalid extra payment {!r}".format(payment))
+        _check(_is_number(amount), file_name, "invalid extra payment {!r}".format(payment))
+    settings.kreditsumme = float(settings.kreditsumme)
+    settings.zins = float(settings.zins)
+    settings.tilgung = float(settings.tilgung)
+    settings.extra_payments = [(month, float(amount)) for month, amount in extra_payments]
+    return settings
+
+
+def _settings_to_dict(settings):
+    """
+    :returns: the project in the JSON format
+    :rtype: dict
+    """
+    return {
+        'format': PROJECT_FORMAT,
+        'version': PROJECT_VERSION,
+        'kreditsumme': settings.kreditsumme,
+        'zins': settings.zins,
+        'tilgung': settings.tilgung,
+        'start_date': settings.start_date,
+        'extra_payments': [list(payment) for payment in settings.extra_payments]}
+
+
+def _load_yaml(text, file_name):
+    """
+    Loads an older YAML project file.
+
+    :rtype: CreditSettings
+    :raises ProjectFileError: if the file is not a valid project file
+    """
+    yaml, loader = _yaml()
+    try:
+        settings = yaml.load(text, Loader=loader)
+    except yaml.YAMLError as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
+    if isinstance(settings, dict):
+        # The JSON format written as YAML
+        return _settings_from_dict(settings, file_name)
+    _check(isinstance(settings, CreditSettings), file_name, "not a credit project file")
+    return _validate(settings, file_name)
+
+
+@profiling.timed('settings.load')
+def load_settings(file_name):
+    """
+    Loads a project file of the JSON format or an older YAML project file.
+    Does not need PyQt5.
+
+    :param file_name (str): path of the project file
+    :rtype: CreditSettings
+    :raises ProjectFileError: if the file is not a valid project file
+    """
+    try:
+        with open(file_name, 'r') as file:
+            text = file.read()
+    except (OSError, UnicodeDecodeError) as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return _load_yaml(text, file_name)
+    return _settings_from_dict(data, file_name)
+
+
+def load_directory(directory):
+    """
+    Loads all project files of a directory.
+
+    :param directory (str): path of the directory
+    :returns: (projects, errors). projects are the paths and settings of the
+              valid project files, sorted by path, errors are the paths and
+              error messages of the others. The messages contain the path.
+    :rtype: tuple(list of (str, CreditSettings), list of (str, str))
+    """
+    projects = []
+    errors = []
+    for name in sorted(os.listdir(directory)):
+        file_name = os.path.join(directory, name)
+        if not name.lower().endswith(PROJECT_EXTENSIONS) or not os.path.isfile(file_name):
+            continue
+        try:
+            projects.append((file_name, load_settings(file_name)))
+        except ProjectFileError as ex:
+            errors.append((file_name, str(ex)))
+    return projects, errors
+
+
+@profiling.timed('settings.save')
+def save_settings(settings, file_name):
+    """
+    Saves a project file in the JSON format.
+
+    :param settings (CreditSettings): the settings
+    :param file_name (str): path of the project file
+    :raises ProjectFileError: if the settings cannot be written
+    """
+    try:
+        text = json.dumps(_settings_to_dict(settings), indent=2, allow_nan=False)
+    except (TypeError, ValueError) as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
+    try:
+        with open(file_name, mode='w') as file:
+            file.write(text)
+    except OSError as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
+
+
+def load_extra_payments(file_name):
+    """
+    Reads extra payments from a CSV file with the columns month (MM/yyyy) and
+    amount. A header line is skipped.
+
+    :param file_name (str): path of the CSV file
+    :returns: month and amount
+    :rtype: list of (str, float)
+    :raises ProjectFileError: if a line is invalid
+    """
+    payments = []
+    try:
+        with open(file_name, newline='') as file:
+            for line_no, row in enumerate(csv.reader(file)):
+                if not row or (line_no == 0 and not row[0][:1].isdigit()):
+                    continue
+                try:
+                    month, amount = row[:2]
+                    year, month = util.parse_month(month.strip())
+                    amount = float(amount)
+                    if not math.isfinite(amount):
+                        raise ValueError(amount)
+                    payments.append(("{:02d}/{}".format(month, year), amount))
+                except ValueError:
+                    raise ProjectFileError("{}: invalid extra payment in line {}".format(
+                        file_name, line_no + 1))
+    except (OSError, UnicodeDecodeError, csv.Error) as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
+    return payments
+
+
+def save_extra_payments(payments, file_name):
+    """
+    Writes extra payments into a CSV file, see load_extra_payments.
+
+    :param payments (list of (str, float)): month (MM/yyyy) and amount
+    :param file_name (str): path of the CSV file
+    :raises ProjectFileError: if the file cannot be written
+    """
+    try:
+        with open(file_name, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('month', 'amount'))
+            writer.writerows(payments)
+    except OSError as ex:
+        raise ProjectFileError("{}: {}".format(file_name, ex))
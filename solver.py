@@ -0,0 +1,183 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Solves for one of loan amount, interest, redemption rate/monthly rate and
+term, given the others.
+
+Between extra payments the balance of an annuity follows a geometric series,
+so the balance after n months is known analytically:
+
+    S_n = S_0 * r^n - rate * (r^n - 1) / q - sum(E_m * r^(n - m))
+
+with q = nominal interest / 12, r = 1 + q and the extra payments E_m in
+month m <= n. Loan amount and monthly rate enter linearly and are solved in
+closed form, the interest is found by bisection.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import math
+
+from kredit import AnnuitaetenKredit
+
+MAX_ZINS = 100.0 # upper limit of the interest search in %
+# Solutions are moved by this relative amount to the safe side. Otherwise
+# rounding errors of the month by month calculation may leave a tiny balance
+# for an additional month.
+_SICHERHEIT = 1e-9
+
+
+def _aufzinsung(q, monate):
+    """
+    :returns: r^monate
+    """
+    return math.exp(monate * math.log1p(q))
+
+
+def _rentenfaktor(q, monate):
+    """
+    :returns: (r^monate - 1) / q, the value of monate monthly payments of 1
+    """
+    if q == 0.0:
+        return float(monate)
+    return math.expm1(monate * math.log1p(q)) / q
+
+
+def _sondertilgungen_wert(q, laufzeit, sondertilgungen):
+    """
+    :returns: value of the extra payments within laufzeit months at the end
+              of the term
+    """
+    return sum(
+        betrag * _aufzinsung(q, laufzeit - monat - 1)
+        for monat, betrag in sondertilgungen.items()
+        if 0 <= monat < laufzeit)
+
+
+def restschuld(betrag, monatsrate, zins, laufzeit, sondertilgungen={}):
+    """
+    Balance after laufzeit months. The balance is not limited by zero, it gets
+    negative, if the loan is paid off earlier.
+
+    :param betrag (float): loan amount
+    :param monatsrate (float): monthly rate
+    :param zins (float): nominal interest in %
+    :param laufzeit (int): number of months
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :rtype: float
+    """
+    q = zins / 1200.0
+    return (betrag * _aufzinsung(q, laufzeit)
+            - monatsrate * _rentenfaktor(q, laufzeit)
+            - _sondertilgungen_wert(q, laufzeit, sondertilgungen))
+
+
+def loese_laufzeit(betrag, tilgung, zins, sondertilgungen={}):
+    """
+    Term of a loan.
+
+    :param betrag (float): loan amount
+    :param tilgung (float): redemption rate in %
+    :param zins (float): nominal interest in %
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :returns: number of months
+    :rtype: int
+    :raises ValueError: if the loan is never paid off.
+    """
+    kredit = AnnuitaetenKredit(betrag, tilgung, zins)
+    return len(kredit.berechne_segmentiert(sondertilgungen))
+
+
+def loese_monatsrate(betrag, zins, laufzeit, sondertilgungen={}):
+    """
+    Monthly rate, which pays off the loan in laufzeit months.
+
+    :param betrag (float): loan amount
+    :param zins (float): nominal interest in %
+    :param laufzeit (int): number of months
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :rtype: float
+    """
+    if laufzeit < 1:
+        raise ValueError("Term must be at least one month")
+    q = zins / 1200.0
+    return ((betrag * _aufzinsung(q, laufzeit)
+             - _sondertilgungen_wert(q, laufzeit, sondertilgungen))
+            / _rentenfaktor(q, laufzeit)) * (1 + _SICHERHEIT)
+
+
+def loese_tilgung(betrag, zins, laufzeit, sondertilgungen={}):
+    """
+    Redemption rate, which pays off the loan in laufzeit months.
+
+    :param betrag (float): loan amount
+    :param zins (float): nominal interest in %
+    :param laufzeit (int): number of months
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :returns: redemption rate in %
+    :rtype: float
+    """
+    if betrag <= 0:
+        raise ValueError("Loan amount must be positive")
+    monatsrate = loese_monatsrate(betrag, zins, laufzeit, sondertilgungen)
+    return 1200.0 * monatsrate / betrag - zins
+
+
+def loese_betrag(monatsrate, zins, laufzeit, sondertilgungen={}):
+    """
+    Loan amount, which is paid off by monatsrate in laufzeit months.
+
+    :param monatsrate (float): monthly rate
+    :param zins (float): nominal interest in %
+    :param laufzeit (int): number of months
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :rtype: float
+    """
+    if laufzeit < 1:
+        raise ValueError("Term must be at least one month")
+    q = zins / 1200.0
+    return ((monatsrate * _rentenfaktor(q, laufzeit)
+             + _sondertilgungen_wert(q, laufzeit, sondertilgungen))
+            / _aufzinsung(q, laufzeit)) * (1 - _SICHERHEIT)
+
+
+def loese_zins(betrag, monatsrate, laufzeit, sondertilgungen={}, toleranz=1e-10):
+    """
+    Nominal interest, at which monatsrate pays off the loan in laufzeit months.
+
+    :param betrag (float): loan amount
+    :param monatsrate (float): monthly rate
+    :param laufzeit (int): number of months
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :param toleranz (float): accuracy of the interest in %
+    :returns: nominal interest in %
+    :rtype: float
+    :raises ValueError: if there is no interest between 0 and MAX_ZINS.
+    """
+    if laufzeit < 1:
+        raise ValueError("Term must be at least one month")
+
+    def rest(zins):
+        return restschuld(betrag, monatsrate, zins, laufzeit, sondertilgungen)
+
+    # The balance grows with the interest.
+    unten, oben = 0.0, MAX_ZINS
+    if rest(unten) > 0:
+        raise ValueError("The payments do not even pay off the loan without interest")
+    if rest(oben) < 0:
+        raise ValueError("Interest would exceed {}%".format(MAX_ZINS))
+    while oben - unten > toleranz:
+        mitte = (unten + oben) / 2
+        if rest(mitte) > 0:
+            oben = mitte
+        else:
+            unten = mitte
+    return unten * (1 - _SICHERHEIT)
@@ -8,39 +8,206 @@ __author__ = "Sofie & Bernd Krietenstein"
 __copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
 __license__ = "see LICENSE file"
 
+import math
 import sys
 
 from PyQt5.QtWidgets import (
     QDialog,
     QApplication,
-    QWidget,
     QPushButton,
-    QLineEdit,
     QDateEdit,
     QDateTimeEdit,
+    QFileDialog,
     QMessageBox,
-    QAction,
-    QTableWidget,
-    QTableWidgetItem,
+    QStyledItemDelegate,
+    QTableView,
     QHeaderView,
     QVBoxLayout,
-    QHBoxLayout,
-    QSizePolicy
+    QHBoxLayout
 )
 from PyQt5.QtCore import (
     Qt,
-    QDate
-)
-from PyQt5.QtGui import (
-    QPalette,
-    QIcon
+    QAbstractTableModel,
+    QDate,
+    QModelIndex,
+    QVariant
 )
 
 import conf
 import log
- 
+import util
+from settings import ProjectFileError, load_extra_payments, save_extra_payments
+
+
+class ExtraPaymentModel(QAbstractTableModel):
+    """
+    Extra payments as table model. The months are kept as (year, month), the
+    amounts as entered text, which is validated by SotiDialog.
+    """
+    COLUMNS = ("Date", "Payment")
+
+    def __init__(self, payments=None, parent=None):
+        """
+        C'tor.
+
+        :param payments (list of (str, float)): month (MM/yyyy) and amount
+        :param parent (QObject): parent
+        """
+        super(ExtraPaymentModel, self).__init__(parent)
+        self._rows = []
+        self.set_payments(payments or [])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        month, amount = self._rows[index.row()]
+        if role == Qt.DisplayRole:
+            if index.column() == 0:
+                return "{:02d}/{}".format(month[1], month[0])
+            return amount
+        if role == Qt.EditRole:
+            if index.column() == 0:
+                return QDate(month[0], month[1], 1)
+            return amount
+        return QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        row = self._rows[index.row()]
+        if index.column() == 0:
+            row[0] = util.year_month(value)
+        else:
+            row[1] = str(value)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index):
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self.COLUMNS[section]
+            return section + 1
+        return QVariant()
+
+    def sort(self, column=0, order=Qt.AscendingOrder):
+        """
+        Sorts by month or by amount. Invalid amounts are sorted to the end.
+        """
+        def amount(row):
+            try:
+                value = float(row[1])
+            except ValueError:
+                return (1, 0.0)
+            return (0, value) if math.isfinite(value) else (1, 0.0)
+        self.layoutAboutToBeChanged.emit()
+        self._rows.sort(
+            key=(lambda row: row[0]) if column == 0 else amount,
+            reverse=order == Qt.DescendingOrder)
+        self.layoutChanged.emit()
+
+    def set_payments(self, payments):
+        """
+        Replaces all payments.
+
+        :param payments (list of (str, float)): month (MM/yyyy) and amount
+        """
+        self.beginResetModel()
+        self._rows = [[util.parse_month(month), str(amount)] for month, amount in payments]
+        self.endResetModel()
+
+    def add_payment(self, month, amount=0.0):
+        """
+        Appends a payment.
+
+        :param month (QDate, datetime.date or tuple (year, month)): the month
+        :param amount (float): the amount
+        """
+        row = len(self._rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._rows.append([util.year_month(month), str(amount)])
+        self.endInsertRows()
+
+    def remove_payment(self, row):
+        """
+        :param row (int): row of the payment
+        """
+        if 0 <= row < len(self._rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+
+    def validate(self):
+        """
+        Payments must be convertable into finite floats. Only one payment per
+        month is allowed.
+
+        :returns: error message or None
+        :rtype: str
+        """
+        for row_no, (_, amount) in enumerate(self._rows):
+            try:
+                valid = math.isfinite(float(amount))
+            except ValueError:
+                valid = False
+            if not valid:
+                return "Invalid values in table in row {}".format(row_no + 1)
+        # Make sure, only one payment per month is made
+        rows = {}
+        for row_no, (month, _) in enumerate(self._rows):
+            if month in rows:
+                return (
+                    "Ambiguous payments in rows {} and {}\n"
+                    "Only one payment per month is allowed.".format(
+                        rows[month] + 1,
+                        row_no + 1))
+            rows[month] = row_no
+        return None
+
+    @property
+    def payments(self):
+        """
+        :returns: month (MM/yyyy) and amount of the valid payments
+        :rtype: list of (str, float)
+        """
+        payment_list = []
+        for month, amount in self._rows:
+            try:
+                value = float(amount)
+                if not math.isfinite(value):
+                    raise ValueError("Extra payment must be finite: {}".format(amount))
+                payment_list.append(("{:02d}/{}".format(month[1], month[0]), value))
+            except ValueError as ex:
+                log.LOGGER.error(ex)
+        return payment_list
+
+
+class MonthDelegate(QStyledItemDelegate):
+    """
+    Edits a month by a QDateEdit. The editor exists only while a cell is
+    edited.
+    """
+    def createEditor(self, parent, option, index):
+        month_edit = QDateEdit(parent)
+        month_edit.setDisplayFormat(conf.DATE_FORMAT)
+        month_edit.setCurrentSection(QDateTimeEdit.MonthSection)
+        return month_edit
+
+    def setEditorData(self, editor, index):
+        editor.setDate(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.date(), Qt.EditRole)
+
+
 class SotiDialog(QDialog):
-    
+
     def __init__(self, parent=None, sotis=None):
         super(SotiDialog, self).__init__(parent)
         self.title = 'Enter Unscheduled Redemptions'
@@ -48,31 +215,29 @@ class SotiDialog(QDialog):
         self.height = 600
         if parent:
             pg = parent.frameGeometry()
-            self.left = pg.left() + pg.width() / 2 - self.width / 2
-            self.top = pg.top() + pg.height() / 2 - self.height / 2
+            self.left = pg.left() + pg.width() // 2 - self.width // 2
+            self.top = pg.top() + pg.height() // 2 - self.height // 2
         else:
             self.left = 200
             self.top = 200
-        
+
         self._table_widget = None
-        
-        self.initUI()
+        self._model = ExtraPaymentModel(sotis, self)
 
-        if sotis:
-            for payment in sotis:
-                self._add_payment(payment)
+        self.initUI()
 
         self._table_widget.clearFocus()
- 
+
     def initUI(self):
         self.setWindowTitle(self.title)
         self.setGeometry(self.left, self.top, self.width, self.height)
- 
-        self._table_widget = QTableWidget()
-        # self._table_widget.setRowCount(1)
-        self._table_widget.setColumnCount(2)
-        self._table_widget.setHorizontalHeaderItem(0, QTableWidgetItem("Date"))
-        self._table_widget.setHorizontalHeaderItem(1, QTableWidgetItem("Payment"))
+
+        self._table_widget = QTableView()
+        self._table_widget.setModel(self._model)
+        self._table_widget.setItemDelegateForColumn(0, MonthDelegate(self._table_widget))
+        # A click on a header sorts by month or amount
+        self._table_widget.horizontalHeader().setSortIndicator(0, Qt.AscendingOrder)
+        self._table_widget.setSortingEnabled(True)
 
         add_button = QPushButton('+')
         add_button.clicked.connect(self._add_payment)
@@ -80,14 +245,21 @@ class SotiDialog(QDialog):
         remove_button.clicked.connect(self._remove_payment)
         sort_button = QPushButton("Sort")
         sort_button.clicked.connect(self._sort_table)
+        import_button = QPushButton("Import")
+        import_button.clicked.connect(self._import_payments)
+        export_button = QPushButton("Export")
+        export_button.clicked.connect(self._export_payments)
         close_button = QPushButton('Close')
         close_button.clicked.connect(self._close)
 
-        # Vertical layout for +- and sort buttons
+        # Vertical layout for +-, sort and CSV buttons
         table_buttons_layout = QVBoxLayout()
         table_buttons_layout.addWidget(add_button)
         table_buttons_layout.addWidget(remove_button)
         table_buttons_layout.addWidget(sort_button)
+        table_buttons_layout.addWidget(import_button)
+        table_buttons_layout.addWidget(export_button)
+        table_buttons_layout.addStretch(1)
 
         # Horizontal layout for table and buttons
         table_layout = QHBoxLayout()
@@ -100,52 +272,69 @@ class SotiDialog(QDialog):
         layout.addWidget(close_button)
         self.setLayout(layout)
 
-        # Set size policy
+        # Set size policy. Fixed row heights do not depend on the cell contents.
         self._table_widget.horizontalHeader().setSectionResizeMode(
             QHeaderView.Stretch)
+        self._table_widget.verticalHeader().setSectionResizeMode(
+            QHeaderView.Fixed)
 
         # Cosmetics
         self._table_widget.horizontalHeader().setStyleSheet(
             "::section { background-color:lightGray }")
 
-    def _add_payment(self, payment=None):
+    def _add_payment(self):
         """
         Add a line with a new extra payment.
-
-        :param payment (tuple(str, float)): Extra payment for a month.
         """
-        self._table_widget.insertRow(self._table_widget.rowCount())
-        current_row = self._table_widget.rowCount() - 1
-        if payment:
-            month = QDate.fromString(payment[0], conf.DATE_FORMAT)
-            amount = payment[1]
-        else:
-            month = QDate.currentDate()
-            amount = 0.0
-        month_edit = QDateEdit(month)
-        month_edit.setDisplayFormat(conf.DATE_FORMAT)
-        month_edit.currentSection = QDateTimeEdit.MonthSection
-        self._table_widget.setCellWidget(current_row, 0, month_edit)
-        self._table_widget.setItem(current_row, 1, QTableWidgetItem(str(amount)))
+        self._model.add_payment(QDate.currentDate())
+        self._table_widget.scrollToBottom()
 
     def _remove_payment(self):
         """
         Remove the current row.
         """
-        self._table_widget.removeRow(self._table_widget.currentRow())
+        self._model.remove_payment(self._table_widget.currentIndex().row())
 
     def _sort_table(self):
         """
         Sort the table date-wise
         """
-        # later...
-        pass
+        self._table_widget.sortByColumn(0, Qt.AscendingOrder)
+
+    def _import_payments(self):
+        """
+        Replace the payments by those of a CSV file.
+        """
+        file_name = QFileDialog.getOpenFileName(
+            self, "Import Extra Payments", "", "CSV Files (*.csv)")[0]
+        if not file_name:
+            return
+        try:
+            self._model.set_payments(load_extra_payments(file_name))
+        except ProjectFileError as ex:
+            QMessageBox.critical(self, "Import error", str(ex))
+
+    def _export_payments(self):
+        """
+        Write the payments into a CSV file.
+        """
+        validation_error = self._validate()
+        if validation_error:
+            QMessageBox.critical(self, "Validation error", validation_error)
+            return
+        file_name = QFileDialog.getSaveFileName(
+            self, "Export Extra Payments", "", "CSV Files (*.csv)")[0]
+        if not file_name:
+            return
+        try:
+            save_extra_payments(self.payments, file_name)
+        except ProjectFileError as ex:
+            QMessageBox.critical(self, "Export error", str(ex))
 
     def _close(self):
         """
         Close dialog after successful validation.
         """
-        # Implement validation here
         validation_error = self._validate()
         if not validation_error:
             self.accept()
@@ -160,45 +349,15 @@ class SotiDialog(QDialog):
         Validate table. Payments must be convertable into float. Only one
         payment per month is allowed.
         """
-        # Make sure, payments are convertable into float.
-        current_row = 0
-        try:
-            for row_no in range(self._table_widget.rowCount()):
-                current_row = row_no
-                float(self._table_widget.item(row_no, 1).text())
-        except ValueError:
-            return "Invalid values in table in row {}".format(current_row + 1)
-        # Make sure, only on payment per month is made
-        row_count = self._table_widget.rowCount()
-        if row_count > 1:
-            for row_no in range(row_count):
-                for row_no2 in range(row_no + 1, row_count):
-                    date1 = self._table_widget.cellWidget(row_no, 0).date()
-                    date2 = self._table_widget.cellWidget(row_no2, 0).date()
-                    if date1 == date2:
-                        return (
-                            "Ambiguous payments in rows {} and {}\n"
-                            "Only one payment per month is allowed.".format(
-                                row_no + 1,
-                                row_no2 + 1))
-        return None
+        return self._model.validate()
 
     @property
     def payments(self):
         """
         :returns: List of extra payments.
-        :rtype: list(QDate, float)
+        :rtype: list(str, float)
         """
-        payment_list = []
-        try:
-            for row_no in range(self._table_widget.rowCount()):
-                date_edit = self._table_widget.cellWidget(row_no, 0)
-                date = date_edit.date().toString(conf.DATE_FORMAT)
-                amount = float(self._table_widget.item(row_no, 1).text())
-                payment_list.append((date, amount))
-        except Exception as ex:
-            log.LOGGER.error(ex)
-        return payment_list
+        return self._model.payments
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
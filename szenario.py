@@ -0,0 +1,154 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Monte Carlo simulation of the refinancing at the end of the fixed-rate
+period (Zinsbindung).
+
+The remaining balance is refinanced at a random rate. The rate follows a
+random walk with normally distributed changes, a new rate is fixed every
+folgebindung months. The follow-up loans keep the monthly rate, unless the
+new interest requires a higher rate to reach the minimum redemption rate.
+Extra payments after the fixed-rate period are paid in every path. All paths are calculated together, period by period, with the segment
+formulas of the portfolio engine.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import numpy as np
+
+from portfolio import MAX_MONATE, _restschuld, _tilgungsmonate
+
+PERZENTILE = (5, 25, 50, 75, 95)
+
+
+class SzenarioErgebnis(object):
+    """
+    Results of all simulated rate paths.
+    """
+    def __init__(self, gesamtkosten, laufzeit, anschlusszins):
+        """
+        C'tor.
+
+        :param gesamtkosten (ndarray of float): sum of interest of each path
+        :param laufzeit (ndarray of int): term in months of each path
+        :param anschlusszins (ndarray of float): first rate after the
+               fixed-rate period in % of each path
+        """
+        self.GesamtKosten = gesamtkosten
+        self.Laufzeit = laufzeit
+        self.Anschlusszins = anschlusszins
+
+    def kosten_perzentile(self, perzentile=PERZENTILE):
+        """
+        :returns: key: percentile, value: sum of interest
+        :rtype: dict of (int, float)
+        """
+        return dict(zip(perzentile, np.percentile(self.GesamtKosten, perzentile)))
+
+    def laufzeit_perzentile(self, perzentile=PERZENTILE):
+        """
+        :returns: key: percentile, value: term in months
+        :rtype: dict of (int, float)
+        """
+        return dict(zip(perzentile, np.percentile(self.Laufzeit, perzentile)))
+
+
+def simuliere_anschlussfinanzierung(
+        verlauf,
+        zinsbindung,
+        zins,
+        tilgung,
+        anzahl=10000,
+        volatilitaet=1.0,
+        drift=0.0,
+        folgebindung=120,
+        mindestzins=0.0,
+        seed=None,
+        sondertilgungen=None):
+    """
+    Simulates the refinancing of a loan.
+
+    :param verlauf (Kreditverlauf): schedule from berechne_kreditverlauf
+    :param zinsbindung (int): months of the fixed-rate period
+    :param zins (float): nominal interest in % at the start of the loan
+    :param tilgung (float): minimum redemption rate in % of the follow-up loans
+    :param anzahl (int): number of rate paths
+    :param volatilitaet (float): standard deviation of the rate change per
+           year in percentage points
+    :param drift (float): expected rate change per year in percentage points
+    :param folgebindung (int): months of the fixed-rate periods of the
+           follow-up loans
+    :param mindestzins (float): lower limit of the rates in %
+    :param seed (int): seed of the random number generator
+    :param sondertilgungen (dict of (int,float)): Extra payments of the
+           schedule. key: month, value: amount. Those after the fixed-rate
+           period split the follow-up periods into segments like in
+           portfolio.berechne_kennzahlen. May be None.
+    :return: results. Paths, which are not paid off within MAX_MONATE months,
+             end there.
+    :rtype: SzenarioErgebnis
+    """
+    if tilgung <= 0:
+        raise ValueError("Redemption rate must be positive")
+    if zinsbindung < 1 or folgebindung < 1:
+        raise ValueError("Fixed-rate periods must be at least one month")
+    rng = np.random.default_rng(seed)
+
+    zinsen = np.asarray(verlauf.spalte('Zinsanteil'))
+    restschulden = np.asarray(verlauf.spalte('Restschuld'))
+    kosten_bindung = zinsen[:zinsbindung].sum()
+    if zinsbindung >= len(verlauf):
+        # Paid off within the fixed-rate period
+        return SzenarioErgebnis(
+            np.full(anzahl, kosten_bindung),
+            np.full(anzahl, len(verlauf), dtype=np.intp),
+            np.full(anzahl, np.nan))
+
+    sondertilgungen = sondertilgungen or {}
+    soti_monate = sorted(monat + 1 for monat in sondertilgungen if monat >= zinsbindung)
+    s = np.full(anzahl, restschulden[zinsbindung - 1])
+    rate = np.full(anzahl, verlauf.Monatsrate)
+    zges = np.full(anzahl, kosten_bindung)
+    laufzeit = np.zeros(anzahl, dtype=np.intp)
+    offen = np.ones(anzahl, dtype=bool)
+    aktueller_zins = np.full(anzahl, float(zins))
+    anschlusszins = None
+    monat = zinsbindung + 1 # first month of the period
+    jahre = zinsbindung / 12.0
+    while offen.any() and monat <= MAX_MONATE:
+        aktueller_zins = np.maximum(
+            aktueller_zins + rng.normal(drift * jahre, volatilitaet * np.sqrt(jahre), anzahl),
+            mindestzins)
+        if anschlusszins is None:
+            anschlusszins = aktueller_zins.copy()
+        q = aktueller_zins / 1200.0
+        rate = np.maximum(rate, s * (tilgung + aktueller_zins) / 1200.0)
+
+        periode_ende = monat + folgebindung
+        starts = [monat] + [start for start in soti_monate if monat < start < periode_ende]
+        for nummer, start in enumerate(starts):
+            ende = starts[nummer + 1] if nummer + 1 < len(starts) else periode_ende
+            soti = sondertilgungen.get(start - 1, 0.0)
+            # First month of the segment contains the extra payment.
+            nach_erstem = s * (1 + q) - rate - soti
+            fertig = offen & (nach_erstem <= 0)
+            zges[fertig] += (s * q)[fertig]
+            laufzeit[fertig] = start
+            offen &= ~fertig
+
+            monate = _tilgungsmonate(nach_erstem, rate, q)
+            fertig = offen & (monate > 0) & (start + monate < ende)
+            vor_letztem = _restschuld(nach_erstem, rate, q, np.maximum(monate - 1, 0))
+            zges[fertig] += (rate * monate + soti - (s - vor_letztem) + vor_letztem * q)[fertig]
+            laufzeit[fertig] = (start + monate)[fertig]
+            offen &= ~fertig
+
+            segment_ende = _restschuld(nach_erstem, rate, q, ende - start - 1)
+            zges[offen] += (rate * (ende - start) + soti - (s - segment_ende))[offen]
+            s = np.where(offen, segment_ende, 0.0)
+        monat = periode_ende
+        jahre = folgebindung / 12.0
+    laufzeit[offen] = MAX_MONATE
+    return SzenarioErgebnis(zges, laufzeit, anschlusszins)
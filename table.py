@@ -16,13 +16,67 @@ from PyQt5.QtWidgets import (
     QWidget,
     QPushButton,
     QAction,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QHeaderView,
     QVBoxLayout
 )
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import (
+    Qt,
+    QAbstractTableModel,
+    QVariant
+)
+
+import profiling
+import util
+
+
+class KreditverlaufModel(QAbstractTableModel):
+    """
+    Table model over a credit schedule. Cells are formatted when the view
+    asks for them, i.e. only the visible ones.
+    """
+    COLUMNS = (
+        ('Zinsanteil', "Interest"),
+        ('Tilgungsanteil', "Rate of\nRedemption"),
+        ('Sondertilgungsanteil', "Unscheduled\nRedemption"),
+        ('Restschuld', "Balance"))
+
+    def __init__(self, verlauf, start_date, parent=None):
+        """
+        C'tor.
+
+        :param verlauf (Kreditverlauf): The schedule
+        :param start_date (QDate, datetime.date or tuple (year, month)):
+               start of the schedule
+        """
+        super(KreditverlaufModel, self).__init__(parent)
+        self._monate = verlauf.spalte('Monat')
+        self._spalten = [verlauf.spalte(name) for name, _ in self.COLUMNS]
+        self._start = util.month_index(start_date)
+
+    def rowCount(self, parent=None):
+        return len(self._monate)
+
+    def columnCount(self, parent=None):
+        return len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return "{:.2f}".format(self._spalten[index.column()][index.row()])
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self.COLUMNS[section][1]
+            year, month = util.from_month_index(self._start + self._monate[section] - 1)
+            return "{}/{}".format(month, year)
+        if role == Qt.TextAlignmentRole and orientation == Qt.Vertical:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return QVariant()
 
 
 class TableDialog(QDialog):
@@ -33,15 +87,15 @@ class TableDialog(QDialog):
         self.width = 600
         self.height = 600
         pg = parent.frameGeometry()
-        self.left = pg.left() + pg.width() / 2 - self.width / 2
-        self.top = pg.top() + pg.height() / 2 - self.height / 2
+        self.left = pg.left() + pg.width() // 2 - self.width // 2
+        self.top = pg.top() + pg.height() // 2 - self.height // 2
         self.initUI()
 
     def initUI(self):
         self.setWindowTitle(self.title)
         self.setGeometry(self.left, self.top, self.width, self.height)
 
-        self._table_widget = QTableWidget()
+        self._table_widget = QTableView()
         close_button = QPushButton('Close')
         close_button.clicked.connect(self.close)
 
@@ -51,63 +105,39 @@ class TableDialog(QDialog):
         self.layout.addWidget(close_button)
         self.setLayout(self.layout)
 
-        # Set size policy
+        # Set size policy. Fixed row heights do not depend on the cell contents,
+        # so the view does not need to look at all rows.
         self._table_widget.horizontalHeader().setSectionResizeMode(
             QHeaderView.Stretch)
+        self._table_widget.verticalHeader().setSectionResizeMode(
+            QHeaderView.Fixed)
 
         # Cosmetics
         self._table_widget.horizontalHeader().setStyleSheet(
             "::section { background-color:lightGray }")
 
+    @profiling.timed('table.show_table')
     def show_table(self, verlauf, start_date):
         """
         Shows the table.
 
-        :param verlauf (list of KreditverlaufsZwischenstand objects): 
-               The schedule
-        :param start_date (QDate): start of the schedule
+        :param verlauf (Kreditverlauf): The schedule
+        :param start_date (QDate, datetime.date or tuple (year, month)):
+               start of the schedule
         """
-        self._table_widget.clear()
-        self._table_widget.setRowCount(len(verlauf))
-        self._table_widget.setColumnCount(4)
-
-        self._table_widget.setHorizontalHeaderItem(0, QTableWidgetItem("Interest"))
-        self._table_widget.setHorizontalHeaderItem(1, QTableWidgetItem("Rate of\nRedemption"))
-        self._table_widget.setHorizontalHeaderItem(2, QTableWidgetItem("Unscheduled\nRedemption"))
-        self._table_widget.setHorizontalHeaderItem(3, QTableWidgetItem("Balance"))
-
-        i = 0
-        for zwischenstand in verlauf:
-            monat   = QTableWidgetItem(self.calculate_date(start_date, zwischenstand.Monat))
-            zins    = QTableWidgetItem("{:.2f}".format(zwischenstand.Zinsanteil))
-            tilgung = QTableWidgetItem("{:.2f}".format(zwischenstand.Tilgungsanteil))
-            soti    = QTableWidgetItem("{:.2f}".format(zwischenstand.Sondertilgungsanteil))
-            rest    = QTableWidgetItem("{:.2f}".format(zwischenstand.Restschuld))
-            monat.setTextAlignment(Qt.AlignRight)
-            zins.setTextAlignment(Qt.AlignRight)
-            tilgung.setTextAlignment(Qt.AlignRight)
-            soti.setTextAlignment(Qt.AlignRight)
-            rest.setTextAlignment(Qt.AlignRight)
-            self._table_widget.setVerticalHeaderItem(i, monat)
-            self._table_widget.setItem(i, 0, zins)
-            self._table_widget.setItem(i, 1, tilgung)
-            self._table_widget.setItem(i, 2, soti)
-            self._table_widget.setItem(i, 3, rest)
-            i += 1
-
-        # self._table_widget.move(0,0)
+        self._table_widget.setModel(KreditverlaufModel(verlauf, start_date, self))
 
     def calculate_date(self, start_date, month):
         """
         Calculates the date month months after the start date.
 
-        :param start_date (QDate): stat date
+        :param start_date (QDate, datetime.date or tuple (year, month)): stat date
         :param month (int): n-th month after sart date
         :return: string representation of the date
         :rtype: str
         """
-        current_date = start_date.addMonths(month - 1)
-        return "{}/{}".format(current_date.month(), current_date.year())
+        year, current_month = util.from_month_index(util.month_index(start_date) + month - 1)
+        return "{}/{}".format(current_month, year)
  
 if __name__ == '__main__':
     app = QApplication(sys.argv)
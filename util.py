@@ -1,36 +1,134 @@
 #! /usr/bin/python
 # -*-  coding: utf-8 -*-
 """
-Provides utility functions.
+Provides utility functions. Does not need PyQt5.
+
+Months can be represented by a month index 12 * year + month - 1. The
+difference of two indices is the number of months between them, adding
+months is an addition.
 """
 
 __author__ = "Sofie & Bernd Krietenstein"
 __copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
 __license__ = "see LICENSE file"
 
-from PyQt5.QtCore import (
-    QDate
-)
+def year_month(date):
+    """
+    Year and month of a date.
+
+    :param date: QDate, datetime.date or tuple (year, month)
+    :returns: (year, month)
+    :rtype: tuple(int, int)
+    """
+    if isinstance(date, tuple):
+        return date
+    year = date.year
+    month = date.month
+    if callable(year):
+        # QDate
+        return year(), month()
+    return year, month
 
 def month_diff(date1, date2):
     """
     Calculates the time difference abs(date1 - date2) between two dates in months.
     Day is neglected.
 
-    :param date1 (QDate): First date
-    :param date2 (QDate): Second date
+    :param date1 (QDate, datetime.date or tuple (year, month)): First date
+    :param date2 (QDate, datetime.date or tuple (year, month)): Second date
 
     :returns: The time difference in months
     :rtype: int
     """
-    # First make sure, that date2 > date1
-    if date1.daysTo(date2) < 0:
-        date_tmp = date1
-        date1 = date2
-        date2 = date_tmp
-    years = date2.year() - date1.year()
-    months = date2.month() - date1.month()
-    if months < 0:
-        years -= 1
-        months += 12
-    return 12 * years + months
+    year1, month1 = year_month(date1)
+    year2, month2 = year_month(date2)
+    return abs(12 * (year2 - year1) + month2 - month1)
+
+def add_months(date, months):
+    """
+    Calculates the date months months after date.
+
+    :param date (QDate, datetime.date or tuple (year, month)): the date
+    :param months (int): number of months, may be negative
+
+    :returns: (year, month)
+    :rtype: tuple(int, int)
+    """
+    return from_month_index(month_index(date) + months)
+
+def month_index(date):
+    """
+    :param date (QDate, datetime.date or tuple (year, month)): the date
+    :returns: 12 * year + month - 1
+    :rtype: int
+    """
+    year, month = year_month(date)
+    return 12 * year + month - 1
+
+def from_month_index(index):
+    """
+    :param index (int): month index, see month_index
+    :returns: (year, month)
+    :rtype: tuple(int, int)
+    """
+    year, month = divmod(index, 12)
+    return year, month + 1
+
+def parse_month(text):
+    """
+    Parses a date in the format MM/yyyy (see conf.DATE_FORMAT).
+
+    :param text (str): the date
+    :returns: (year, month)
+    :rtype: tuple(int, int)
+    :raises ValueError: if the text is no valid date
+    """
+    month, year = text.split('/')
+    month = int(month)
+    if not 1 <= month <= 12:
+        raise ValueError("Invalid month in {}".format(text))
+    return int(year), month
+
+def parse_months(texts):
+    """
+    Parses dates in the format MM/yyyy (see conf.DATE_FORMAT) in one pass.
+
+    :param texts (iterable of str): the dates
+    :returns: month indices, see month_index
+    :rtype: list of int
+    :raises ValueError: if a text is no valid date
+    """
+    indices = []
+    append = indices.append
+    for text in texts:
+        month, year = text.split('/')
+        month = int(month)
+        if not 1 <= month <= 12:
+            raise ValueError("Invalid month in {}".format(text))
+        append(12 * int(year) + month - 1)
+    return indices
+
+def format_months(indices):
+    """
+    Formats month indices in the format MM/yyyy (see conf.DATE_FORMAT).
+
+    :param indices (iterable of int): month indices, see month_index
+    :rtype: list of str
+    """
+    return ["{:02d}/{}".format(index % 12 + 1, index // 12) for index in indices]
+
+def month_offsets(texts, start):
+    """
+    Converts dates into months relative to a start date. Dates before the
+    start date get negative offsets.
+
+    :param texts (iterable of str): dates in the format MM/yyyy
+    :param start (str MM/yyyy, QDate, datetime.date or tuple (year, month)):
+           the start date
+    :returns: number of months after the start date
+    :rtype: list of int
+    """
+    if isinstance(start, str):
+        start = parse_month(start)
+    start = month_index(start)
+    return [index - start for index in parse_months(texts)]
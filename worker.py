@@ -0,0 +1,126 @@
+#! /usr/bin/python
+# -*-  coding: utf-8 -*-
+"""
+Runs calculations of the main dialog in a background thread, so the dialog
+stays responsive and the calculation can be cancelled.
+"""
+
+__author__ = "Sofie & Bernd Krietenstein"
+__copyright__ = "Copyright (C) 2018 Sofie & Bernd Krietenstein"
+__license__ = "see LICENSE file"
+
+import threading
+
+from PyQt5.QtCore import (
+    QObject,
+    QThread,
+    pyqtSignal
+)
+
+from cache import CACHE
+from kredit import AnnuitaetenKredit
+
+
+class Cancelled(Exception):
+    """
+    Raised inside the calculation, when it has been cancelled.
+    """
+
+
+class CalculationWorker(QObject):
+    """
+    Runs a function in a background thread. The function gets the worker as
+    first argument and reports its progress by report_progress, which also
+    stops the calculation after cancel has been called.
+
+    Exactly one of the signals result, failed or cancelled is emitted at the
+    end.
+    """
+    progress = pyqtSignal(int) # progress in %
+    result = pyqtSignal(object) # return value of the function
+    failed = pyqtSignal(str) # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, function, *args):
+        """
+        C'tor.
+
+        :param function (callable): function(worker, *args)
+        :param args: further arguments of the function
+        """
+        super(CalculationWorker, self).__init__()
+        self._function = function
+        self._args = args
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the calculation in a new thread.
+        """
+        self._thread = QThread()
+        self.moveToThread(self._thread)
+        self._thread.started.connect(self.run)
+        self._thread.start()
+
+    def cancel(self):
+        """
+        Requests to stop the calculation. Thread-safe.
+        """
+        self._cancel.set()
+
+    def wait(self):
+        """
+        Waits until the thread has finished.
+        """
+        if self._thread is not None:
+            self._thread.wait()
+
+    def report_progress(self, percent):
+        """
+        Called by the function in the background thread.
+
+        :param percent (int): progress in %
+        :raises Cancelled: if the calculation has been cancelled
+        """
+        if self._cancel.is_set():
+            raise Cancelled()
+        self.progress.emit(percent)
+
+    def run(self):
+        """
+        Runs the function. Executed in the background thread.
+        """
+        try:
+            result = self._function(self, *self._args)
+        except Cancelled:
+            self.cancelled.emit()
+        except Exception as ex:
+            self.failed.emit(str(ex))
+        else:
+            self.result.emit(result)
+        finally:
+            self._thread.quit()
+
+
+def calculate_schedule(worker, kredit, betrag, tilgung, zins, sondertilgungen):
+    """
+    Calculates the schedule of the main dialog by the cache.
+
+    :param worker (CalculationWorker): the worker running the calculation
+    :param kredit (AnnuitaetenKredit): calculator with the same betrag,
+           tilgung and zins, see KreditverlaufCache.berechne_kreditverlauf
+    :param betrag (float): loan amount
+    :param tilgung (float): redemption rate in %
+    :param zins (float): nominal interest in %
+    :param sondertilgungen (dict of (int,float)): Extra payments.
+           key: month, value: amount.
+    :rtype: Kreditverlauf
+    :raises ValueError: if the loan is never paid off.
+    """
+    # The analytic term is cheap. It rejects loans, which are never paid off,
+    # and gives the total number of months for the progress.
+    laufzeit = len(AnnuitaetenKredit(betrag, tilgung, zins).berechne_segmentiert(sondertilgungen))
+    return CACHE.berechne_kreditverlauf(
+        betrag, tilgung, zins, sondertilgungen, kredit=kredit,
+        fortschritt=lambda monat: worker.report_progress(100 * monat // max(laufzeit, 1)))